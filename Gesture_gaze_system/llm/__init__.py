@@ -1,25 +1,36 @@
+import importlib
+
 from .base_llm import BaseLLM
-from .phi4 import Phi4LLM
-from .qwen_omni import QwenOmniLLM
-from .chat_openai import OpenAILLM
+
+# 各后端按需加载，仅使用OpenAI时不会导入torch/transformers
+_BACKENDS = {
+    'phi4': ('.phi4', 'Phi4LLM'),
+    'qwen': ('.qwen_omni', 'QwenOmniLLM'),
+    'openai': ('.chat_openai', 'OpenAILLM')
+}
+
+_CLASS_TO_MODULE = {class_name: module for module, class_name in _BACKENDS.values()}
+
+def _load_backend(module_name, class_name):
+    return getattr(importlib.import_module(module_name, __name__), class_name)
+
+def __getattr__(name):
+    """延迟导入 Phi4LLM / QwenOmniLLM / OpenAILLM"""
+    if name in _CLASS_TO_MODULE:
+        return _load_backend(_CLASS_TO_MODULE[name], name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_llm(model_name):
     """
     根据模型名称获取对应的LLM实例
-    
+
     Args:
         model_name (str): 模型名称，支持 'phi4', 'qwen', 'openai'
-        
+
     Returns:
         BaseLLM: 对应的LLM实例
     """
-    model_map = {
-        'phi4': Phi4LLM,
-        'qwen': QwenOmniLLM,
-        'openai': OpenAILLM
-    }
-    
-    if model_name.lower() not in model_map:
-        raise ValueError(f"不支持的模型: {model_name}。支持的模型: {list(model_map.keys())}")
-    
-    return model_map[model_name.lower()]()
\ No newline at end of file
+    if model_name.lower() not in _BACKENDS:
+        raise ValueError(f"不支持的模型: {model_name}。支持的模型: {list(_BACKENDS.keys())}")
+
+    return _load_backend(*_BACKENDS[model_name.lower()])()
@@ -0,0 +1,47 @@
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _rescale_normalize_chw_kernel(u8, mean, inv_std, out):
+        """单次遍历完成 u8->f32、均值方差归一化以及 HWC->CHW 转置"""
+        height, width, channels = u8.shape
+        scale = np.float32(1.0 / 255.0)
+        for y in prange(height):
+            for x in range(width):
+                for c in range(channels):
+                    out[c, y, x] = (u8[y, x, c] * scale - mean[c]) * inv_std[c]
+else:
+    def _rescale_normalize_chw_kernel(u8, mean, inv_std, out):
+        """未安装numba时的NumPy实现"""
+        np.multiply(u8, np.float32(1.0 / 255.0), out=out.transpose(1, 2, 0), casting="unsafe")
+        out -= mean[:, None, None]
+        out *= inv_std[:, None, None]
+
+def rescale_normalize_chw(u8: np.ndarray,
+                          mean: np.ndarray,
+                          inv_std: np.ndarray,
+                          out: np.ndarray = None) -> np.ndarray:
+    """
+    将HWC排布的uint8图像转换为归一化后的CHW float32数组
+    
+    Args:
+        u8 (np.ndarray): 形状为 (H, W, C) 的uint8图像
+        mean (np.ndarray): 各通道均值，float32，形状为 (C,)
+        inv_std (np.ndarray): 各通道标准差的倒数，float32，形状为 (C,)
+        out (np.ndarray, optional): 预分配的 (C, H, W) float32 输出缓冲区
+        
+    Returns:
+        np.ndarray: 形状为 (C, H, W) 的float32数组
+    """
+    u8 = np.ascontiguousarray(u8, dtype=np.uint8)
+    height, width, channels = u8.shape
+    if out is None:
+        out = np.empty((channels, height, width), dtype=np.float32)
+    _rescale_normalize_chw_kernel(u8, mean, inv_std, out)
+    return out
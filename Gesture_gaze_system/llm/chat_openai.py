@@ -1,37 +1,261 @@
 import os
-import json
-from typing import Dict, List, Optional, Any, Union
+import copy
+import asyncio
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Union, Iterator, Set
+import httpx
 import openai
 
 from .base_llm import BaseLLM
-from .utils import create_multimodal_message
+from .utils import create_multimodal_message, json_dumps
+
+# 多模态输入的系统提示词
+SYSTEM_PROMPT_MULTIMODAL = """你是一个能够理解多模态输入的AI助手。你将接收图像、手势信息和眼动数据，
+通过综合分析这些输入来理解用户意图并执行适当的操作。
+
+手势可能是以下之一:
+- pinch: 捏合手势，通常表示选择或确认
+- double pinch: 双击捏合手势，通常表示执行特殊操作
+- grip: 抓握手势，通常表示抓取或拖动
+- twist left: 左扭手势，通常表示向左旋转或返回
+- twist right: 右扭手势，通常表示向右旋转或前进
+- thumb up: 竖起大拇指，通常表示肯定或赞同
+- thumb down: 竖起大拇指，通常表示否定或不赞同
+
+眼动数据表示为(x,y,r)，其中(x,y)是用户注视的坐标，r是注视区域的半径。"""
+
+# 同步与异步客户端共用的HTTP/2连接池配置
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+# 按(api_key, base_url)共享的OpenAI客户端，多个实例复用同一连接池
+_CLIENTS: Dict[tuple, openai.OpenAI] = {}
+
+def _get_shared_client(api_key: str, base_url: Optional[str]) -> openai.OpenAI:
+    """
+    获取共享的OpenAI客户端，底层httpx客户端启用HTTP/2和连接池
+    
+    Args:
+        api_key (str): OpenAI API密钥
+        base_url (Optional[str]): API基础URL
+        
+    Returns:
+        openai.OpenAI: 共享的客户端实例
+    """
+    key = (api_key, base_url)
+    client = _CLIENTS.get(key)
+    if client is None:
+        http_client = httpx.Client(http2=True, limits=_HTTP_LIMITS)
+        client = openai.OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        _CLIENTS[key] = client
+    return client
+
+class _MicroBatcher:
+    """
+    将短时间窗口内并发到达的请求合并，在同一个AsyncOpenAI客户端上一起发出
+    
+    内部持有一个后台事件循环线程，同步调用方通过create()提交请求并阻塞等待结果；
+    不再使用时调用close()停止后台线程并关闭异步客户端
+    """
+    
+    def __init__(self, api_key: str, base_url: Optional[str], window_ms: float = 5, max_batch: int = 8):
+        """
+        初始化微批处理器
+        
+        Args:
+            api_key (str): OpenAI API密钥
+            base_url (Optional[str]): API基础URL
+            window_ms (float): 合并请求的时间窗口(毫秒)
+            max_batch (int): 单批最大请求数
+        """
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._closed = False
+        # 后台循环中运行的任务，持有强引用避免被垃圾回收，完成后自动移除
+        self._tasks: Set[asyncio.Task] = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="openai-microbatch", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(api_key, base_url), self._loop).result()
+        
+    async def _start(self, api_key: str, base_url: Optional[str]) -> None:
+        """在后台事件循环中创建队列、异步客户端和调度任务"""
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # 与同步客户端相同的HTTP/2连接池配置，整个生命周期内复用
+        http_client = httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS)
+        self._client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        self._spawn(self._drain())
+        
+    def _spawn(self, coro) -> asyncio.Task:
+        """在后台事件循环中创建任务并登记到self._tasks"""
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+        
+    async def submit(self, kwargs: Dict[str, Any]):
+        """
+        提交一个请求并等待其响应
+        
+        Args:
+            kwargs (Dict[str, Any]): chat.completions.create的请求参数
+            
+        Returns:
+            ChatCompletion: API响应
+        """
+        future = self._loop.create_future()
+        await self._queue.put((kwargs, future))
+        return await future
+    
+    def create(self, kwargs: Dict[str, Any]):
+        """
+        同步提交请求，供非异步调用方使用
+        
+        Args:
+            kwargs (Dict[str, Any]): chat.completions.create的请求参数
+            
+        Returns:
+            ChatCompletion: API响应
+        """
+        if self._closed:
+            raise RuntimeError("_MicroBatcher已关闭")
+        return asyncio.run_coroutine_threadsafe(self.submit(kwargs), self._loop).result()
+    
+    async def _create_many(self, kwargs_list: List[Dict[str, Any]]) -> list:
+        """在后台事件循环中并发发出一组请求，不经过合并窗口"""
+        return await asyncio.gather(*[self._client.chat.completions.create(**kwargs) for kwargs in kwargs_list])
+    
+    def create_many(self, kwargs_list: List[Dict[str, Any]]) -> list:
+        """
+        同步并发发出一组请求，可在任何线程(包括已运行事件循环的线程)中调用
+        
+        Args:
+            kwargs_list (List[Dict[str, Any]]): 每个请求的chat.completions.create参数
+            
+        Returns:
+            list: 与输入顺序一致的API响应
+        """
+        if self._closed:
+            raise RuntimeError("_MicroBatcher已关闭")
+        return asyncio.run_coroutine_threadsafe(self._create_many(kwargs_list), self._loop).result()
+    
+    async def acreate_many(self, kwargs_list: List[Dict[str, Any]]) -> list:
+        """
+        create_many的异步版本，等待结果时不阻塞调用方的事件循环
+        
+        Args:
+            kwargs_list (List[Dict[str, Any]]): 每个请求的chat.completions.create参数
+            
+        Returns:
+            list: 与输入顺序一致的API响应
+        """
+        if self._closed:
+            raise RuntimeError("_MicroBatcher已关闭")
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._create_many(kwargs_list), self._loop))
+    
+    def close(self) -> None:
+        """取消所有未完成的任务、关闭异步客户端并停止后台线程，可重复调用"""
+        if self._closed:
+            return
+        self._closed = True
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        
+    async def _shutdown(self) -> None:
+        """在后台事件循环中取消调度和分发任务，并关闭异步客户端的连接池"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 仍在队列中的请求以取消结束，避免调用方永远等待
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+        await self._client.close()
+        
+    async def _drain(self) -> None:
+        """收集时间窗口内的请求，凑成一批后交给_dispatch并发发出"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.window
+            try:
+                while len(batch) < self.max_batch:
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # close()时已取出但尚未分发的请求一并取消
+                for _, future in batch:
+                    future.cancel()
+                raise
+            # 不等待本批完成即开始收集下一批
+            self._spawn(self._dispatch(batch))
+            
+    async def _dispatch(self, batch) -> None:
+        """并发发出一批请求，并把结果或异常分发给各自的调用方"""
+        try:
+            results = await asyncio.gather(
+                *[self._client.chat.completions.create(**kwargs) for kwargs, _ in batch],
+                return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
 
 class OpenAILLM(BaseLLM):
     """OpenAI API调用实现"""
     
-    def __init__(self, api_key=None, model="gpt-4o"):
+    def __init__(self, api_key=None, model="gpt-4o", micro_batch=False):
         """
         初始化OpenAI客户端
         
         Args:
             api_key (str, optional): OpenAI API密钥，如果不指定则从环境变量获取
             model (str, optional): 模型名称，默认为gpt-4o
+            micro_batch (bool, optional): 是否合并多线程并发到达的非流式请求；
+                chat_batch总是使用后台异步客户端，首次调用时按需创建
         """
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("未提供OpenAI API密钥，请在.env文件中设置OPENAI_API_KEY或在初始化时提供")
             
         self.model = model
-        self.client = openai.OpenAI(api_key=self.api_key,base_url=os.environ.get("OPENAI_BASE_URL"))
+        self.client = _get_shared_client(self.api_key, os.environ.get("OPENAI_BASE_URL"))
+        self._micro_batch = micro_batch
+        self._batcher_lock = threading.Lock()
+        self._batcher: Optional[_MicroBatcher] = None
+        self._batcher_finalizer: Optional[weakref.finalize] = None
+        if micro_batch:
+            self._get_batcher()
+        
+        # 确定性请求(temperature<=0)的LRU响应缓存
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_max = 512
         print(f"OpenAI客户端初始化完成，使用模型: {model}")
         
-    def chat(self, 
-             messages: List[Dict[str, str]], 
-             functions: Optional[List[Dict[str, Any]]] = None, 
-             temperature: float = 0.7,
-             max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    def _cache_key(self,
+                   messages: List[Dict[str, str]],
+                   functions: Optional[List[Dict[str, Any]]],
+                   temperature: float,
+                   max_tokens: Optional[int]) -> str:
         """
-        基础对话功能实现
+        根据请求内容生成缓存键
         
         Args:
             messages (List[Dict[str, str]]): 对话历史
@@ -40,9 +264,55 @@ class OpenAILLM(BaseLLM):
             max_tokens (Optional[int]): 最大生成token数
             
         Returns:
-            Dict[str, Any]: 模型响应
+            str: 请求内容的sha256摘要
+        """
+        payload = json_dumps(
+            (self.model, messages, temperature, max_tokens, functions),
+            sort_keys=True
+        )
+        return hashlib.sha256(payload).hexdigest()
+    
+    def _cache_get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """命中时返回缓存响应的副本并刷新LRU顺序，未命中返回None"""
+        cached = self._cache.get(cache_key)
+        if cached is None:
+            return None
+        self._cache.move_to_end(cache_key)
+        return copy.deepcopy(cached)
+    
+    def _cache_put(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """写入响应副本，超出容量时淘汰最久未使用的条目"""
+        self._cache[cache_key] = copy.deepcopy(result)
+        if len(self._cache) > self._cache_max:
+            self._cache.popitem(last=False)
+    
+    def _get_batcher(self) -> _MicroBatcher:
+        """获取本实例的后台异步客户端，首次调用时创建"""
+        with self._batcher_lock:
+            if self._batcher is None:
+                batcher = _MicroBatcher(self.api_key, os.environ.get("OPENAI_BASE_URL"))
+                # 调用方未调用close()时，实例被回收或进程退出时停止后台线程；回调不能引用self
+                self._batcher_finalizer = weakref.finalize(self, batcher.close)
+                self._batcher = batcher
+            return self._batcher
+        
+    def _build_kwargs(self,
+                      messages: List[Dict[str, str]],
+                      functions: Optional[List[Dict[str, Any]]],
+                      temperature: float,
+                      max_tokens: Optional[int]) -> Dict[str, Any]:
+        """
+        构建chat.completions.create的请求参数
+        
+        Args:
+            messages (List[Dict[str, str]]): 对话历史
+            functions (Optional[List[Dict[str, Any]]]): 函数定义
+            temperature (float): 温度参数
+            max_tokens (Optional[int]): 最大生成token数
+            
+        Returns:
+            Dict[str, Any]: 请求参数
         """
-        # 参数准备
         kwargs = {
             "model": self.model,
             "messages": messages,
@@ -57,11 +327,18 @@ class OpenAILLM(BaseLLM):
             kwargs["tools"] = [{"type": "function", "function": f} for f in functions]
             kwargs["tool_choice"] = "auto"
             
-        # 发送请求
-        response = self.client.chat.completions.create(**kwargs)
+        return kwargs
+        
+    def _parse_message(self, message) -> Dict[str, Any]:
+        """
+        将API返回的message转换为统一的响应格式
         
-        # 处理响应
-        message = response.choices[0].message
+        Args:
+            message: chat.completions返回的choice.message
+            
+        Returns:
+            Dict[str, Any]: 模型响应
+        """
         result = {
             "role": "assistant",
             "content": message.content
@@ -78,6 +355,233 @@ class OpenAILLM(BaseLLM):
                 }
                 
         return result
+        
+    def chat_stream(self,
+                    messages: List[Dict[str, str]],
+                    functions: Optional[List[Dict[str, Any]]] = None,
+                    temperature: float = 0.7,
+                    max_tokens: Optional[int] = None) -> Iterator[Union[str, Dict[str, Any]]]:
+        """
+        流式对话，模型一开始输出就能拿到首个token
+        
+        Args:
+            messages (List[Dict[str, str]]): 对话历史
+            functions (Optional[List[Dict[str, Any]]]): 函数定义
+            temperature (float): 温度参数
+            max_tokens (Optional[int]): 最大生成token数
+            
+        Yields:
+            Union[str, Dict[str, Any]]: 逐段产出文本增量(str)；流结束后产出一个与chat()返回格式一致的完整响应(dict)
+        """
+        kwargs = self._build_kwargs(messages, functions, temperature, max_tokens)
+        kwargs["stream"] = True
+        
+        content_parts = []
+        # 按index累积分片到达的工具调用
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        
+        for chunk in self.client.chat.completions.create(**kwargs):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            
+            if delta.content:
+                content_parts.append(delta.content)
+                yield delta.content
+                
+            if delta.tool_calls:
+                for tc in delta.tool_calls:
+                    entry = tool_calls.setdefault(tc.index, {"name": "", "arguments": []})
+                    if tc.function is None:
+                        continue
+                    if tc.function.name:
+                        entry["name"] = tc.function.name
+                    if tc.function.arguments:
+                        entry["arguments"].append(tc.function.arguments)
+        
+        result = {
+            "role": "assistant",
+            "content": "".join(content_parts) if content_parts else None
+        }
+        
+        # 如果有工具调用
+        if tool_calls:
+            tool_call = tool_calls[min(tool_calls)]
+            result["content"] = None
+            result["function_call"] = {
+                "name": tool_call["name"],
+                "arguments": "".join(tool_call["arguments"])
+            }
+            
+        yield result
+        
+    def _complete(self,
+                  messages: List[Dict[str, str]],
+                  functions: Optional[List[Dict[str, Any]]],
+                  temperature: float,
+                  max_tokens: Optional[int] = None,
+                  stream: bool = False) -> Dict[str, Any]:
+        """
+        发送一次对话补全请求，chat与function_call共用
+        
+        Args:
+            messages (List[Dict[str, str]]): 对话历史
+            functions (Optional[List[Dict[str, Any]]]): 函数定义
+            temperature (float): 温度参数
+            max_tokens (Optional[int]): 最大生成token数
+            stream (bool): 是否以流式方式请求
+            
+        Returns:
+            Dict[str, Any]: 模型响应
+        """
+        # 确定性请求优先命中缓存
+        cache_key = None
+        if temperature <= 0.0:
+            cache_key = self._cache_key(messages, functions, temperature, max_tokens)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+        
+        if stream:
+            # 消费自身的流，最后一个元素即完整响应
+            result = None
+            for item in self.chat_stream(messages, functions, temperature, max_tokens):
+                if isinstance(item, dict):
+                    result = item
+        else:
+            # 发送请求
+            kwargs = self._build_kwargs(messages, functions, temperature, max_tokens)
+            if self._micro_batch:
+                response = self._get_batcher().create(kwargs)
+            else:
+                response = self.client.chat.completions.create(**kwargs)
+            
+            # 处理响应
+            result = self._parse_message(response.choices[0].message)
+        
+        if cache_key is not None:
+            self._cache_put(cache_key, result)
+                
+        return result
+    
+    def chat(self, 
+             messages: List[Dict[str, str]], 
+             functions: Optional[List[Dict[str, Any]]] = None, 
+             temperature: float = 0.7,
+             max_tokens: Optional[int] = None,
+             stream: bool = False) -> Dict[str, Any]:
+        """
+        基础对话功能实现
+        
+        Args:
+            messages (List[Dict[str, str]]): 对话历史
+            functions (Optional[List[Dict[str, Any]]]): 函数定义
+            temperature (float): 温度参数
+            max_tokens (Optional[int]): 最大生成token数
+            stream (bool): 是否以流式方式请求，返回格式不变
+            
+        Returns:
+            Dict[str, Any]: 模型响应
+        """
+        return self._complete(messages, functions, temperature, max_tokens, stream)
+    
+    def _plan_batch(self,
+                    batch_messages: List[List[Dict[str, str]]],
+                    functions: Optional[List[Dict[str, Any]]],
+                    temperature: float,
+                    max_tokens: Optional[int]):
+        """
+        为chat_batch/achat_batch准备请求：确定性请求先查缓存，相同的请求只发一次
+        
+        Args:
+            batch_messages (List[List[Dict[str, str]]]): 多组对话历史
+            functions (Optional[List[Dict[str, Any]]]): 函数定义
+            temperature (float): 温度参数
+            max_tokens (Optional[int]): 最大生成token数
+            
+        Returns:
+            tuple: (已填入缓存命中的结果列表, 待发送请求的[(缓存键, 结果下标列表)], 对应的请求参数列表)
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(batch_messages)
+        groups: Dict[Any, List[int]] = {}
+        for i, messages in enumerate(batch_messages):
+            if temperature <= 0.0:
+                cache_key = self._cache_key(messages, functions, temperature, max_tokens)
+                cached = self._cache_get(cache_key)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+                groups.setdefault(cache_key, []).append(i)
+            else:
+                groups[i] = [i]
+        pending = list(groups.items())
+        kwargs_list = [
+            self._build_kwargs(batch_messages[indices[0]], functions, temperature, max_tokens)
+            for _, indices in pending
+        ]
+        return results, pending, kwargs_list
+    
+    def _finish_batch(self, results, pending, responses, temperature: float) -> List[Dict[str, Any]]:
+        """将响应解析后填入结果列表，确定性请求写入缓存"""
+        for (cache_key, indices), response in zip(pending, responses):
+            result = self._parse_message(response.choices[0].message)
+            if temperature <= 0.0:
+                self._cache_put(cache_key, result)
+            results[indices[0]] = result
+            for i in indices[1:]:
+                results[i] = copy.deepcopy(result)
+        return results
+    
+    def chat_batch(self,
+                   batch_messages: List[List[Dict[str, str]]],
+                   functions: Optional[List[Dict[str, Any]]] = None,
+                   temperature: float = 0.7,
+                   max_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        批量发送多组相互独立的对话请求
+        
+        所有请求在本实例长期持有的AsyncOpenAI客户端上并发发出，复用HTTP/2连接池；
+        相同的系统提示词前缀还可以命中服务端的前缀缓存。temperature<=0时先查响应缓存。
+        请求在后台事件循环中执行，可以在已运行的事件循环中调用(会阻塞到全部完成，
+        异步代码中请使用achat_batch)。
+        
+        Args:
+            batch_messages (List[List[Dict[str, str]]]): 多组对话历史
+            functions (Optional[List[Dict[str, Any]]]): 函数定义
+            temperature (float): 温度参数
+            max_tokens (Optional[int]): 最大生成token数
+            
+        Returns:
+            List[Dict[str, Any]]: 与输入顺序一致的模型响应列表
+        """
+        results, pending, kwargs_list = self._plan_batch(batch_messages, functions, temperature, max_tokens)
+        if not pending:
+            return results
+        responses = self._get_batcher().create_many(kwargs_list)
+        return self._finish_batch(results, pending, responses, temperature)
+    
+    async def achat_batch(self,
+                          batch_messages: List[List[Dict[str, str]]],
+                          functions: Optional[List[Dict[str, Any]]] = None,
+                          temperature: float = 0.7,
+                          max_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        chat_batch的异步版本，等待响应时不阻塞调用方的事件循环
+        
+        Args:
+            batch_messages (List[List[Dict[str, str]]]): 多组对话历史
+            functions (Optional[List[Dict[str, Any]]]): 函数定义
+            temperature (float): 温度参数
+            max_tokens (Optional[int]): 最大生成token数
+            
+        Returns:
+            List[Dict[str, Any]]: 与输入顺序一致的模型响应列表
+        """
+        results, pending, kwargs_list = self._plan_batch(batch_messages, functions, temperature, max_tokens)
+        if not pending:
+            return results
+        responses = await self._get_batcher().acreate_many(kwargs_list)
+        return self._finish_batch(results, pending, responses, temperature)
     
     def function_call(self, 
                      messages: List[Dict[str, str]], 
@@ -94,7 +598,25 @@ class OpenAILLM(BaseLLM):
         Returns:
             Dict[str, Any]: 包含函数调用信息的响应
         """
-        return self.chat(messages, functions, temperature)
+        return self._complete(messages, functions, temperature)
+    
+    def close(self) -> None:
+        """
+        释放本实例持有的资源：停止后台事件循环线程并关闭其异步客户端。
+        共享的OpenAI客户端由同一(api_key, base_url)的所有实例共用，不在这里关闭
+        """
+        with self._batcher_lock:
+            finalizer, self._batcher_finalizer = self._batcher_finalizer, None
+            self._batcher = None
+        if finalizer is not None:
+            # finalize只会执行一次，之后实例被回收时不再重复关闭
+            finalizer()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
     
     def process_multimodal_input(self,
                                image: Optional[Union[str, bytes]] = None,
@@ -126,21 +648,7 @@ class OpenAILLM(BaseLLM):
         messages = []
         
         # 添加系统提示词
-        system_message = """你是一个能够理解多模态输入的AI助手。你将接收图像、手势信息和眼动数据，
-通过综合分析这些输入来理解用户意图并执行适当的操作。
-
-手势可能是以下之一:
-- pinch: 捏合手势，通常表示选择或确认
-- double pinch: 双击捏合手势，通常表示执行特殊操作
-- grip: 抓握手势，通常表示抓取或拖动
-- twist left: 左扭手势，通常表示向左旋转或返回
-- twist right: 右扭手势，通常表示向右旋转或前进
-- thumb up: 竖起大拇指，通常表示肯定或赞同
-- thumb down: 竖起大拇指，通常表示否定或不赞同
-
-眼动数据表示为(x,y,r)，其中(x,y)是用户注视的坐标，r是注视区域的半径。"""
-
-        messages.append({"role": "system", "content": system_message})
+        messages.append({"role": "system", "content": SYSTEM_PROMPT_MULTIMODAL})
         messages.append(multimodal_message)
         
         # 调用chat方法
@@ -1,12 +1,14 @@
 import os
-import json
-import re
+import hashlib
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any, Union
+import numpy as np
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer, AutoProcessor
 
 from .base_llm import BaseLLM
-from .utils import load_prompt_template, format_functions_for_phi, create_multimodal_message
+from ._image_kernels import rescale_normalize_chw
+from .utils import load_prompt_template, format_functions_for_phi, create_multimodal_message, PrefixKVCache, load_rgb_image, FN_CACHE_SIZE, json_dumps, json_loads, extract_between, scan_json_objects, get_model_load_kwargs, sampling_kwargs, move_inputs_to_device
 
 class Phi4LLM(BaseLLM):
     """Phi-4多模态模型的本地部署实现"""
@@ -36,12 +38,18 @@ class Phi4LLM(BaseLLM):
         print(f"正在加载Phi4模型: {model_path}")
         self.model = AutoModelForCausalLM.from_pretrained(
             model_path,
-            torch_dtype=torch.float16,
+            **get_model_load_kwargs(),
             device_map="auto",
             trust_remote_code=True,
             _attn_implementation='flash_attention_2'  # 性能优化
         )
         
+        # 可选：COMPILE_LLM=1时编译前向计算，融合kernel以减少逐token的调度开销
+        # 默认关闭：首次调用有编译预热成本；使用默认模式而非reduce-overhead，
+        # 因为多轮复用的DynamicCache长度不断增长，CUDA Graph会按形状反复重新录制
+        if os.environ.get("COMPILE_LLM", "0") == "1":
+            self.model.forward = torch.compile(self.model.forward, dynamic=True)
+        
         # 使用正确的Tokenizer/Processor
         try:
             self.processor = AutoProcessor.from_pretrained(model_path, trust_remote_code=True)
@@ -52,8 +60,55 @@ class Phi4LLM(BaseLLM):
             self.use_processor = False
             print("使用AutoTokenizer进行输入处理")
         
+        # processor明确给出的图像分辨率(宽, 高)或保持宽高比的最短边，无法确定时为None
+        self._image_target_size, self._image_shortest_edge = (
+            self._resolve_image_size() if self.use_processor else (None, None)
+        )
+        # 图像归一化参数(mean, 1/std)，processor不支持跳过归一化时为None
+        self._image_norm = self._resolve_image_norm() if self.use_processor else None
+        
+        # 函数调用系统提示词的LRU缓存，键为functions内容的摘要
+        self._fn_prompt_cache: "OrderedDict[bytes, str]" = OrderedDict()
+        
+        # 多轮对话的KV缓存复用：上一轮的past_key_values及其对应的token序列
+        self._prefix_cache = PrefixKVCache()
+        
         print("Phi4模型加载完成")
         
+    def _resolve_image_size(self):
+        """
+        从processor的image_processor配置中读取目标图像尺寸
+        
+        只在配置明确给出宽高时返回固定尺寸；shortest_edge只约束短边，按比例缩放以免改变宽高比；
+        其他写法(如单个整数)含义因processor而异，不做预缩放
+        
+        Returns:
+            Tuple[Optional[Tuple[int, int]], Optional[int]]: (目标尺寸(宽, 高), 最短边)，无法确定的项为None
+        """
+        size = getattr(getattr(self.processor, "image_processor", None), "size", None)
+        if isinstance(size, dict):
+            if "width" in size and "height" in size:
+                return (size["width"], size["height"]), None
+            if "shortest_edge" in size and "longest_edge" not in size:
+                return None, size["shortest_edge"]
+        return None, None
+    
+    def _resolve_image_norm(self):
+        """
+        从image_processor配置中读取归一化参数，用于在processor之外做融合的归一化
+        
+        Returns:
+            Optional[Tuple[np.ndarray, np.ndarray]]: (mean, 1/std)，不支持时返回None
+        """
+        image_processor = getattr(self.processor, "image_processor", None)
+        mean = getattr(image_processor, "image_mean", None)
+        std = getattr(image_processor, "image_std", None)
+        if mean is None or std is None or not hasattr(image_processor, "do_normalize"):
+            return None
+        return (np.asarray(mean, dtype=np.float32),
+                1.0 / np.asarray(std, dtype=np.float32))
+    
+    @torch.inference_mode()
     def chat(self, 
              messages: List[Dict[str, str]], 
              functions: Optional[List[Dict[str, Any]]] = None, 
@@ -81,70 +136,79 @@ class Phi4LLM(BaseLLM):
         # 准备输入
         if self.use_processor:
             # 使用processor处理输入
-            formatted_prompt = ""
+            parts = []
             for msg in messages:
                 if msg["role"] == "system":
-                    formatted_prompt += f"{self.system_prompt_start}\n{msg['content']}\n{self.system_prompt_end}\n"
+                    parts.append(f"{self.system_prompt_start}\n{msg['content']}\n{self.system_prompt_end}\n")
                 elif msg["role"] == "user":
-                    formatted_prompt += f"{self.user_prompt}\n{msg['content']}\n{self.user_prompt_end}\n"
+                    parts.append(f"{self.user_prompt}\n{msg['content']}\n{self.user_prompt_end}\n")
                 elif msg["role"] == "assistant":
-                    formatted_prompt += f"{self.assistant_prompt}\n{msg['content']}\n{self.assistant_prompt_end}\n"
+                    parts.append(f"{self.assistant_prompt}\n{msg['content']}\n{self.assistant_prompt_end}\n")
             
-            formatted_prompt += f"{self.assistant_prompt}\n"
+            parts.append(f"{self.assistant_prompt}\n")
+            formatted_prompt = "".join(parts)
             
-            inputs = self.processor(
+            inputs = move_inputs_to_device(self.processor(
                 text=formatted_prompt,
                 return_tensors="pt"
-            ).to(self.model.device)
+            ), self.model.device)
         else:
             # 使用tokenizer处理输入
-            formatted_messages = self.tokenizer.apply_chat_template(
+            # 模板渲染与分词一次完成，省去中间字符串及二次分词
+            input_ids = self.tokenizer.apply_chat_template(
                 messages, 
-                tokenize=False, 
+                tokenize=True,
+                return_tensors="pt",
                 add_generation_prompt=True
             )
-            
-            inputs = self.tokenizer(formatted_messages, return_tensors="pt").to(self.model.device)
+            inputs = move_inputs_to_device(
+                {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)},
+                self.model.device
+            )
         
-        # 生成回复
+        # 生成回复，复用与上一轮共享前缀的KV缓存，只对新增部分做prefill
         outputs = self.model.generate(
             **inputs,
+            past_key_values=self._prefix_cache.lookup(inputs["input_ids"]),
+            use_cache=True,
+            return_dict_in_generate=True,
             max_new_tokens=max_tokens,
-            temperature=temperature,
-            do_sample=temperature > 0.0,
+            **sampling_kwargs(temperature),
         )
+        self._prefix_cache.store(outputs)
+        sequences = outputs.sequences
         
         # 解码并处理输出
         if self.use_processor:
             response_text = self.processor.batch_decode(
-                outputs[:, inputs['input_ids'].shape[1]:],
+                sequences[:, inputs['input_ids'].shape[1]:],
                 skip_special_tokens=True
             )[0]
         else:
-            response_text = self.tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
+            response_text = self.tokenizer.decode(sequences[0][inputs['input_ids'].shape[1]:], skip_special_tokens=True)
         
         return {
             "content": response_text,
             "role": "assistant"
         }
     
-    def function_call(self, 
-                     messages: List[Dict[str, str]], 
-                     functions: List[Dict[str, Any]],
-                     temperature: float = 0.2) -> Dict[str, Any]:
+    def _function_system_prompt(self, functions: List[Dict[str, Any]]) -> str:
         """
-        使用函数调用能力与模型交互 (通过system prompt实现)
+        构建函数调用的系统提示词，按functions内容缓存，相同工具集只构建一次
         
         Args:
-            messages (List[Dict[str, str]]): 对话历史
             functions (List[Dict[str, Any]]): 函数定义
-            temperature (float): 温度参数
             
         Returns:
-            Dict[str, Any]: 包含函数调用信息的响应
+            str: 系统提示词
         """
-        # 构建增强的系统提示词
-        tools_json = json.dumps(functions)
+        key = hashlib.blake2b(json_dumps(functions, sort_keys=True), digest_size=16).digest()
+        cached = self._fn_prompt_cache.get(key)
+        if cached is not None:
+            self._fn_prompt_cache.move_to_end(key)
+            return cached
+        
+        tools_json = json_dumps(functions).decode()
         system_prompt = f'''{self.system_prompt_start}
 你是一个具备工具调用能力的AI助手，可以根据用户输入调用合适的工具函数。你只需要返回工具调用的具体格式。
 
@@ -159,6 +223,30 @@ class Phi4LLM(BaseLLM):
 4. 如果需要调用多个函数，请将它们放在同一个JSON数组中
 {self.system_prompt_end}'''
         
+        self._fn_prompt_cache[key] = system_prompt
+        if len(self._fn_prompt_cache) > FN_CACHE_SIZE:
+            self._fn_prompt_cache.popitem(last=False)
+        return system_prompt
+    
+    @torch.inference_mode()
+    def function_call(self, 
+                     messages: List[Dict[str, str]], 
+                     functions: List[Dict[str, Any]],
+                     temperature: float = 0.2) -> Dict[str, Any]:
+        """
+        使用函数调用能力与模型交互 (通过system prompt实现)
+        
+        Args:
+            messages (List[Dict[str, str]]): 对话历史
+            functions (List[Dict[str, Any]]): 函数定义
+            temperature (float): 温度参数
+            
+        Returns:
+            Dict[str, Any]: 包含函数调用信息的响应
+        """
+        # 构建增强的系统提示词(按工具集缓存)
+        system_prompt = self._function_system_prompt(functions)
+        
         # 添加系统提示词
         has_system = False
         messages_with_system = []
@@ -187,7 +275,7 @@ class Phi4LLM(BaseLLM):
                 "content": None,
                 "function_call": {
                     "name": tool_call["name"],
-                    "arguments": json.dumps(tool_call.get("arguments", tool_call.get("parameters", {})))
+                    "arguments": json_dumps(tool_call.get("arguments", tool_call.get("parameters", {}))).decode()
                 }
             }
         else:
@@ -210,14 +298,15 @@ class Phi4LLM(BaseLLM):
         tool_calls = []
         
         # 1. 尝试提取 <|tool_call|>[...]<|/tool_call|> 格式
-        tool_call_pattern = rf'{re.escape(self.tool_call_start)}(.+?){re.escape(self.tool_call_end)}'
-        tool_call_matches = re.findall(tool_call_pattern, response_text, re.DOTALL)
+        tool_call_matches = extract_between(response_text, self.tool_call_start, self.tool_call_end)
         
         if tool_call_matches:
             for match in tool_call_matches:
+                if not match:
+                    continue
                 try:
                     # 尝试解析JSON
-                    parsed_json = json.loads(match)
+                    parsed_json = json_loads(match)
                     if isinstance(parsed_json, list):
                         for call in parsed_json:
                             if isinstance(call, dict) and "name" in call:
@@ -229,17 +318,17 @@ class Phi4LLM(BaseLLM):
                         if "arguments" in parsed_json and not "parameters" in parsed_json:
                             parsed_json["parameters"] = parsed_json["arguments"]
                         tool_calls.append(parsed_json)
-                except json.JSONDecodeError:
+                except ValueError:
                     print(f"无法解析JSON: {match}")
         
         # 2. 如果上述方法失败，尝试查找常规的```json```格式
         if not tool_calls:
-            json_pattern = r'```json\s*(.*?)\s*```'
-            json_matches = re.findall(json_pattern, response_text, re.DOTALL)
+            json_matches = extract_between(response_text, "```json", "```")
             
             for match in json_matches:
+                match = match.strip()
                 try:
-                    parsed_json = json.loads(match)
+                    parsed_json = json_loads(match)
                     # 处理直接的函数调用格式
                     if isinstance(parsed_json, dict) and "function" in parsed_json:
                         tool_calls.append({
@@ -251,18 +340,19 @@ class Phi4LLM(BaseLLM):
                         if "arguments" in parsed_json:
                             parsed_json["parameters"] = parsed_json["arguments"]
                         tool_calls.append(parsed_json)
-                except json.JSONDecodeError:
+                except ValueError:
                     print(f"无法解析JSON代码块: {match}")
         
         # 3. 如果仍然失败，尝试查找可能的工具调用对象
         if not tool_calls:
             # 尝试匹配任何可能的JSON对象
-            json_obj_pattern = r'{[^{}]*"(?:function|name)"[^{}]*}'
-            obj_matches = re.findall(json_obj_pattern, response_text)
+            obj_matches = scan_json_objects(response_text)
             
             for match in obj_matches:
+                if '"function"' not in match and '"name"' not in match:
+                    continue
                 try:
-                    parsed_json = json.loads(match)
+                    parsed_json = json_loads(match)
                     if "function" in parsed_json:
                         tool_calls.append({
                             "name": parsed_json["function"],
@@ -272,11 +362,12 @@ class Phi4LLM(BaseLLM):
                         if "arguments" in parsed_json:
                             parsed_json["parameters"] = parsed_json["arguments"]
                         tool_calls.append(parsed_json)
-                except json.JSONDecodeError:
+                except ValueError:
                     continue
                     
         return tool_calls
     
+    @torch.inference_mode()
     def process_multimodal_input(self,
                                image: Optional[Union[str, bytes]] = None,
                                gesture: Optional[str] = None, 
@@ -310,46 +401,52 @@ class Phi4LLM(BaseLLM):
             )
         
         # 构建提示词文本
-        user_prompt = ""
+        prompt_parts = []
         if text:
-            user_prompt += text + "\n"
+            prompt_parts.append(text + "\n")
         
         if gesture:
-            user_prompt += f"用户手势: {gesture}\n"
+            prompt_parts.append(f"用户手势: {gesture}\n")
         
         if gaze:
             x, y, r = gaze
-            user_prompt += f"用户注视位置: ({x}, {y}), 半径: {r}\n"
+            prompt_parts.append(f"用户注视位置: ({x}, {y}), 半径: {r}\n")
+        
+        user_prompt = "".join(prompt_parts)
         
         # 构建消息列表
         messages = [{"role": "system", "content": system_prompt}]
         
         # 处理图像
         if image and self.use_processor:
-            # 如果使用processor，直接处理图像
-            from PIL import Image as PILImage
-            from io import BytesIO
+            # 如果使用processor，直接处理图像(预先缩放到processor的目标分辨率)
+            img = load_rgb_image(image, size=self._image_target_size, min_side=self._image_shortest_edge)
             
-            if isinstance(image, str) and os.path.exists(image):
-                img = PILImage.open(image)
-            elif isinstance(image, bytes):
-                img = PILImage.open(BytesIO(image))
-            else:
-                raise ValueError("图像格式不支持")
+            # 单次遍历完成rescale+normalize+转置，processor中跳过这几步
+            images = img
+            image_kwargs = {}
+            if self._image_norm is not None:
+                mean, inv_std = self._image_norm
+                images = rescale_normalize_chw(np.asarray(img), mean, inv_std)
+                image_kwargs = {
+                    "do_rescale": False,
+                    "do_normalize": False,
+                    "input_data_format": "channels_first",
+                }
             
             # 使用processor处理多模态输入
-            inputs = self.processor(
+            inputs = move_inputs_to_device(self.processor(
                 text=f"{self.user_prompt}\n{user_prompt}\n{self.user_prompt_end}\n{self.assistant_prompt}\n",
-                images=img,
-                return_tensors="pt"
-            ).to(self.model.device)
+                images=images,
+                return_tensors="pt",
+                **image_kwargs
+            ), self.model.device)
             
             # 生成回复
             outputs = self.model.generate(
                 **inputs,
                 max_new_tokens=1024,
-                temperature=0.7,
-                do_sample=True
+                **sampling_kwargs(0.7)
             )
             
             # 解码并处理输出
@@ -368,7 +465,7 @@ class Phi4LLM(BaseLLM):
                         "content": None,
                         "function_call": {
                             "name": tool_call["name"],
-                            "arguments": json.dumps(tool_call.get("arguments", tool_call.get("parameters", {})))
+                            "arguments": json_dumps(tool_call.get("arguments", tool_call.get("parameters", {}))).decode()
                         }
                     }
             
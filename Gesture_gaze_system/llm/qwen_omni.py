@@ -1,11 +1,13 @@
 import os
-import json
 from typing import Dict, List, Optional, Any, Union
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
 from .base_llm import BaseLLM
-from .utils import load_prompt_template, create_multimodal_message
+from .utils import load_prompt_template, create_multimodal_message, PrefixKVCache, load_rgb_image, json_dumps, json_loads, get_model_load_kwargs, sampling_kwargs, move_inputs_to_device
+
+# 图像预缩放的最长边，超过时按比例缩小后再交给模型
+IMAGE_MAX_SIDE = 672
 
 class QwenOmniLLM(BaseLLM):
     """Qwen2.5 Omni模型的本地部署实现"""
@@ -23,13 +25,24 @@ class QwenOmniLLM(BaseLLM):
         print(f"正在加载Qwen2.5 Omni模型: {model_path}")
         self.model = AutoModelForCausalLM.from_pretrained(
             model_path,
-            torch_dtype=torch.float16,
+            **get_model_load_kwargs(),
             device_map="auto",
             trust_remote_code=True
         )
+        
+        # 可选：COMPILE_LLM=1时编译前向计算，融合kernel以减少逐token的调度开销
+        # 默认关闭：首次调用有编译预热成本；使用默认模式而非reduce-overhead，
+        # 因为多轮复用的DynamicCache长度不断增长，CUDA Graph会按形状反复重新录制
+        if os.environ.get("COMPILE_LLM", "0") == "1":
+            self.model.forward = torch.compile(self.model.forward, dynamic=True)
         self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+        
+        # 多轮对话的KV缓存复用：上一轮的past_key_values及其对应的token序列
+        self._prefix_cache = PrefixKVCache()
+        
         print("Qwen2.5 Omni模型加载完成")
         
+    @torch.inference_mode()
     def chat(self, 
              messages: List[Dict[str, str]], 
              functions: Optional[List[Dict[str, Any]]] = None, 
@@ -55,30 +68,38 @@ class QwenOmniLLM(BaseLLM):
             return self.function_call(messages, functions, temperature)
             
         # 准备输入
-        formatted_messages = self.tokenizer.apply_chat_template(
+        # 模板渲染与分词一次完成，省去中间字符串及二次分词
+        input_ids = self.tokenizer.apply_chat_template(
             messages, 
-            tokenize=False, 
+            tokenize=True,
+            return_tensors="pt",
             add_generation_prompt=True
         )
+        inputs = move_inputs_to_device(
+            {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)},
+            self.model.device
+        )
         
-        inputs = self.tokenizer(formatted_messages, return_tensors="pt").to(self.model.device)
-        
-        # 生成回复
+        # 生成回复，复用与上一轮共享前缀的KV缓存，只对新增部分做prefill
         outputs = self.model.generate(
             **inputs,
+            past_key_values=self._prefix_cache.lookup(inputs["input_ids"]),
+            use_cache=True,
+            return_dict_in_generate=True,
             max_new_tokens=max_tokens,
-            temperature=temperature,
-            do_sample=temperature > 0.0,
+            **sampling_kwargs(temperature),
         )
+        self._prefix_cache.store(outputs)
         
         # 解码并处理输出
-        response_text = self.tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
+        response_text = self.tokenizer.decode(outputs.sequences[0][inputs['input_ids'].shape[1]:], skip_special_tokens=True)
         
         return {
             "content": response_text,
             "role": "assistant"
         }
     
+    @torch.inference_mode()
     def function_call(self, 
                      messages: List[Dict[str, str]], 
                      functions: List[Dict[str, Any]],
@@ -100,25 +121,28 @@ class QwenOmniLLM(BaseLLM):
             messages = [{"role": "system", "content": system_prompt}] + messages
             
         # Qwen2.5支持原生函数调用
-        formatted_messages = self.tokenizer.apply_chat_template(
+        # 模板渲染与分词一次完成，省去中间字符串及二次分词
+        input_ids = self.tokenizer.apply_chat_template(
             messages, 
-            tokenize=False,
+            tokenize=True,
+            return_tensors="pt",
             add_generation_prompt=True
         )
-        
-        inputs = self.tokenizer(formatted_messages, return_tensors="pt").to(self.model.device)
+        inputs = move_inputs_to_device(
+            {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)},
+            self.model.device
+        )
         
         # Qwen原生支持tools参数
         outputs = self.model.generate(
             **inputs,
             max_new_tokens=1024,
-            temperature=temperature,
-            do_sample=temperature > 0.0,
+            **sampling_kwargs(temperature),
             tools=functions  # 直接传入tools定义
         )
         
         # 解码并处理输出
-        response = self.tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
+        response = self.tokenizer.decode(outputs[0][inputs['input_ids'].shape[1]:], skip_special_tokens=True)
         
         # 解析函数调用
         try:
@@ -126,16 +150,23 @@ class QwenOmniLLM(BaseLLM):
             # <tool_call>
             # {"name": "function_name", "arguments": {"param1": "value1"}}
             # </tool_call>
-            if "<tool_call>" in response and "</tool_call>" in response:
-                tool_call_content = response.split("<tool_call>")[1].split("</tool_call>")[0].strip()
-                function_call_json = json.loads(tool_call_content)
+            tool_call_content = None
+            i = response.find("<tool_call>")
+            if i != -1:
+                i += len("<tool_call>")
+                j = response.find("</tool_call>", i)
+                if j != -1:
+                    tool_call_content = response[i:j].strip()
+            
+            if tool_call_content is not None:
+                function_call_json = json_loads(tool_call_content)
                 
                 return {
                     "role": "assistant",
                     "content": None,
                     "function_call": {
                         "name": function_call_json["name"],
-                        "arguments": json.dumps(function_call_json["arguments"])
+                        "arguments": json_dumps(function_call_json["arguments"]).decode()
                     }
                 }
             else:
@@ -144,7 +175,7 @@ class QwenOmniLLM(BaseLLM):
                     "role": "assistant",
                     "content": response
                 }
-        except (json.JSONDecodeError, KeyError, IndexError) as e:
+        except (ValueError, KeyError, IndexError) as e:
             # 解析失败，返回原始响应
             print(f"函数调用解析失败: {e}")
             return {
@@ -152,6 +183,7 @@ class QwenOmniLLM(BaseLLM):
                 "content": response
             }
     
+    @torch.inference_mode()
     def process_multimodal_input(self,
                                image: Optional[Union[str, bytes]] = None,
                                gesture: Optional[str] = None, 
@@ -192,32 +224,16 @@ class QwenOmniLLM(BaseLLM):
         
         # Qwen支持多模态输入
         if image:
-            # 处理图像
-            from PIL import Image
-            import base64
-            from io import BytesIO
-            
-            if isinstance(image, str) and os.path.exists(image):
-                img = Image.open(image)
-            elif isinstance(image, bytes):
-                img = Image.open(BytesIO(image))
-            else:
-                raise ValueError("图像格式不支持")
-                
-            # 转换为base64
-            buffered = BytesIO()
-            img.save(buffered, format="JPEG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
+            # 处理图像(预先转换为RGB并按比例缩放)
+            img = load_rgb_image(image, max_side=IMAGE_MAX_SIDE)
             
-            # 添加到消息中
+            # 直接传入PIL图像(Qwen2.5-Omni消息格式原生支持)，省去JPEG重编码和base64拷贝
             messages.append({
                 "role": "user", 
                 "content": [
                     {
                         "type": "image",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{img_str}"
-                        }
+                        "image": img
                     },
                     {
                         "type": "text",
@@ -1,11 +1,140 @@
 import os
 import json
-import base64
-from typing import Dict, List, Any, Optional, Union
+import hashlib
+import mimetypes
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple, Union
 
+# 优先使用带SIMD加速的pybase64，未安装时回退到标准库
+try:
+    import pybase64 as _b64
+except ImportError:
+    import base64 as _b64
+
+# 优先使用orjson，未安装时回退到标准库json，输出同为紧凑的UTF-8字节
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+def json_dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """
+    序列化为紧凑JSON字节
+    
+    Args:
+        obj (Any): 待序列化对象
+        sort_keys (bool): 是否按键排序(用于计算稳定的缓存键)
+        
+    Returns:
+        bytes: UTF-8编码的JSON
+    """
+    if _orjson is not None:
+        return _orjson.dumps(obj, option=_orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys).encode("utf-8")
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    解析JSON，解析失败时抛出ValueError(json.JSONDecodeError)
+    
+    Args:
+        data (Union[str, bytes]): JSON文本
+        
+    Returns:
+        Any: 解析结果
+    """
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+def extract_between(text: str, start: str, end: str) -> List[str]:
+    """
+    提取文本中所有位于start与end标记之间的内容(单次线性扫描，不使用正则)
+    
+    Args:
+        text (str): 待扫描文本
+        start (str): 起始标记
+        end (str): 结束标记
+        
+    Returns:
+        List[str]: 标记之间的内容列表
+    """
+    results = []
+    pos = 0
+    while True:
+        i = text.find(start, pos)
+        if i == -1:
+            break
+        i += len(start)
+        j = text.find(end, i)
+        if j == -1:
+            break
+        results.append(text[i:j])
+        pos = j + len(end)
+    return results
+
+def scan_json_objects(text: str) -> List[str]:
+    """
+    通过括号深度计数找出文本中所有最外层的{...}片段；
+    对象内部的JSON字符串(含转义字符)中的括号不参与计数
+    
+    Args:
+        text (str): 待扫描文本
+        
+    Returns:
+        List[str]: 括号平衡的JSON对象候选片段
+    """
+    candidates = []
+    depth = 0
+    begin = -1
+    in_string = False
+    escaped = False
+    for idx, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"' and depth > 0:
+            in_string = True
+        elif ch == "{":
+            if depth == 0:
+                begin = idx
+            depth += 1
+        elif ch == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                candidates.append(text[begin:idx + 1])
+    return candidates
+
+def _b64encode_to_str(data: bytes) -> str:
+    """将字节编码为base64字符串"""
+    if hasattr(_b64, "b64encode_as_string"):
+        return _b64.b64encode_as_string(data)
+    return _b64.b64encode(data).decode("ascii")
+
+def _b64decode(data: Union[str, bytes]) -> bytes:
+    """
+    严格解码base64图像数据，允许带data URL前缀(如 data:image/jpeg;base64,)
+    
+    Args:
+        data (Union[str, bytes]): base64字符串或data URL
+        
+    Returns:
+        bytes: 解码后的原始字节
+    """
+    if isinstance(data, str) and data.startswith("data:"):
+        data = data[data.index(",") + 1:]
+    return _b64.b64decode(data, validate=True)
+
+_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "prompt_templates")
+
+@lru_cache(maxsize=None)
 def load_prompt_template(template_name: str) -> str:
     """
-    加载提示词模板
+    加载提示词模板，模板为静态文本，读取一次后缓存
     
     Args:
         template_name (str): 模板名称
@@ -13,17 +142,13 @@ def load_prompt_template(template_name: str) -> str:
     Returns:
         str: 提示词模板内容
     """
-    template_path = os.path.join(
-        os.path.dirname(__file__), 
-        "prompt_templates", 
-        f"{template_name}.txt"
-    )
-    
-    if not os.path.exists(template_path):
-        raise FileNotFoundError(f"找不到提示词模板: {template_path}")
+    template_path = os.path.join(_TEMPLATE_DIR, f"{template_name}.txt")
     
-    with open(template_path, "r", encoding="utf-8") as f:
-        return f.read()
+    try:
+        with open(template_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"找不到提示词模板: {template_path}") from None
 
 def encode_image_to_base64(image_path: str) -> str:
     """
@@ -35,8 +160,113 @@ def encode_image_to_base64(image_path: str) -> str:
     Returns:
         str: base64编码的图像
     """
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+    # 按文件大小预分配缓冲区并直接读入，省去read()产生的中间bytes拷贝
+    buf = bytearray(os.path.getsize(image_path))
+    with open(image_path, "rb", buffering=0) as image_file:
+        image_file.readinto(buf)
+    return _b64encode_to_str(buf)
+
+def load_rgb_image(image: Union[str, bytes],
+                   size: Optional[Tuple[int, int]] = None,
+                   max_side: Optional[int] = None,
+                   min_side: Optional[int] = None):
+    """
+    加载图像并预先转换为RGB、缩放到模型所需分辨率，
+    使processor内部较慢的缩放路径直接走"尺寸已匹配"的捷径。
+    安装Pillow-SIMD后此处的resize会自动使用SIMD加速。
+    
+    Args:
+        image (Union[str, bytes]): 图像路径、base64 data URL或图像字节
+        size (Optional[Tuple[int, int]]): 目标尺寸(宽, 高)，与原图一致时跳过缩放
+        max_side (Optional[int]): 保持宽高比时允许的最长边，未超过时跳过缩放
+        min_side (Optional[int]): 保持宽高比缩放到的最短边(与processor的shortest_edge一致)，已相等时跳过缩放
+        
+    Returns:
+        PIL.Image.Image: 处理后的图像
+    """
+    from PIL import Image
+    from io import BytesIO
+    
+    if isinstance(image, str) and image.startswith("data:"):
+        img = Image.open(BytesIO(_b64decode(image)))
+    elif isinstance(image, str) and os.path.exists(image):
+        img = Image.open(image)
+    elif isinstance(image, bytes):
+        img = Image.open(BytesIO(image))
+    else:
+        raise ValueError("图像格式不支持")
+    
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    
+    if size is not None and img.size != tuple(size):
+        img = img.resize(tuple(size), Image.Resampling.BILINEAR)
+    elif max_side is not None and max(img.size) > max_side:
+        scale = max_side / max(img.size)
+        target = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(target, Image.Resampling.BILINEAR)
+    elif min_side is not None and min(img.size) != min_side:
+        # 与transformers的shortest_edge计算一致：短边等于min_side，长边按比例截断取整
+        short, long = sorted(img.size)
+        new_long = int(min_side * long / short)
+        target = (min_side, new_long) if img.width <= img.height else (new_long, min_side)
+        img = img.resize(target, Image.Resampling.BILINEAR)
+    
+    return img
+
+# 函数定义文本的LRU缓存，键为函数列表规范化JSON的摘要，同一组函数在多轮对话中只格式化一次
+FN_CACHE_SIZE = 256
+_FN_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+
+# 函数数量达到该值时改用numpy.char向量化拼接参数行，较小的列表走纯Python路径以免numpy开销
+_VECTORIZE_MIN_FUNCTIONS = 16
+
+try:
+    import numpy as np
+    _NUMPY_AVAILABLE = True
+except ImportError:
+    _NUMPY_AVAILABLE = False
+
+def _format_functions_vectorized(functions: List[Dict[str, Any]]) -> str:
+    """
+    format_functions_for_phi的向量化实现：将所有参数展平为名称/类型/描述数组，
+    用numpy.char一次性拼接参数行，再按函数切片组装，输出与逐项拼接一致
+    
+    Args:
+        functions (List[Dict[str, Any]]): 函数定义列表
+        
+    Returns:
+        str: 格式化后的函数定义文本
+    """
+    names: List[str] = []
+    types: List[str] = []
+    descs: List[str] = []
+    counts: List[int] = []
+    for func in functions:
+        params = func.get("parameters", {}).get("properties", {})
+        for param_name, param_props in params.items():
+            get = param_props.get
+            names.append(str(param_name))
+            types.append(str(get("type", "unknown")))
+            descs.append(str(get("description", "")))
+        counts.append(len(params))
+    
+    lines: List[str] = []
+    if names:
+        add = np.char.add
+        lines = add(add(add(add(add("- ", np.array(names, dtype=str)), " ("), np.array(types, dtype=str)), "): "),
+                    np.array(descs, dtype=str)).tolist()
+    
+    nl = "\n"
+    formatted_functions = []
+    start = 0
+    for func, count in zip(functions, counts):
+        formatted_functions.append(
+            f"函数名称: {func.get('name')}{nl}描述: {func.get('description', '')}{nl}参数:{nl}{nl.join(lines[start:start + count])}{nl}"
+        )
+        start += count
+    
+    return "\n\n".join(formatted_functions)
 
 def format_functions_for_phi(functions: List[Dict[str, Any]]) -> str:
     """
@@ -48,40 +278,230 @@ def format_functions_for_phi(functions: List[Dict[str, Any]]) -> str:
     Returns:
         str: 格式化后的函数定义文本，用于系统提示词
     """
+    key = hashlib.blake2b(json_dumps(functions, sort_keys=True), digest_size=16).digest()
+    cached = _FN_CACHE.get(key)
+    if cached is not None:
+        _FN_CACHE.move_to_end(key)
+        return cached
+    
+    result = _format_functions(functions)
+    _FN_CACHE[key] = result
+    if len(_FN_CACHE) > FN_CACHE_SIZE:
+        _FN_CACHE.popitem(last=False)
+    return result
+
+def _format_functions(functions: List[Dict[str, Any]]) -> str:
+    """format_functions_for_phi的未缓存实现"""
+    if len(functions) >= _VECTORIZE_MIN_FUNCTIONS and _NUMPY_AVAILABLE:
+        return _format_functions_vectorized(functions)
+    
     formatted_functions = []
+    # 局部绑定，内层循环中省去属性查找；parts在函数之间复用
+    parts: List[str] = []
+    append = parts.append
+    nl = "\n"
     
     for func in functions:
-        params = func.get("parameters", {}).get("properties", {})
-        param_desc = []
+        parts.clear()
+        for param_name, param_props in func.get("parameters", {}).get("properties", {}).items():
+            get = param_props.get
+            append(f"- {param_name} ({get('type', 'unknown')}): {get('description', '')}")
         
-        for param_name, param_props in params.items():
-            param_type = param_props.get("type", "unknown")
-            param_description = param_props.get("description", "")
-            param_desc.append(f"- {param_name} ({param_type}): {param_description}")
-        
-        function_text = f"""函数名称: {func.get('name')}
-描述: {func.get('description', '')}
-参数:
-{chr(10).join(param_desc)}
-"""
-        formatted_functions.append(function_text)
+        formatted_functions.append(
+            f"函数名称: {func.get('name')}{nl}描述: {func.get('description', '')}{nl}参数:{nl}{nl.join(parts)}{nl}"
+        )
     
     return "\n\n".join(formatted_functions)
 
+def get_model_load_kwargs() -> Dict[str, Any]:
+    """
+    生成本地模型from_pretrained所需的精度与量化参数
+    
+    支持bf16的GPU(Ampere及以上)使用bfloat16，否则使用float16；
+    通过环境变量LLM_QUANT=int4/int8启用bitsandbytes权重量化。
+    
+    Returns:
+        Dict[str, Any]: torch_dtype及可选的quantization_config
+    """
+    import torch
+    
+    dtype = torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else torch.float16
+    kwargs: Dict[str, Any] = {"torch_dtype": dtype}
+    
+    quant = os.environ.get("LLM_QUANT", "").lower()
+    if quant in ("int4", "int8"):
+        from transformers import BitsAndBytesConfig
+        
+        if quant == "int4":
+            kwargs["quantization_config"] = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_compute_dtype=dtype,
+                bnb_4bit_quant_type="nf4"
+            )
+        else:
+            kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+    elif quant:
+        raise ValueError(f"不支持的量化方式: {quant}。支持: int4, int8")
+    
+    return kwargs
+
+def move_inputs_to_device(inputs, device) -> Dict[str, Any]:
+    """
+    将模型输入搬运到目标设备
+    
+    目标为GPU时先锁页(pin_memory)再以non_blocking方式拷贝，
+    使H2D拷贝与后续的Python准备工作重叠，对多模态的图像张量收益明显
+    
+    Args:
+        inputs: tokenizer/processor的输出(dict或BatchFeature)
+        device: 目标设备
+        
+    Returns:
+        Dict[str, Any]: 已位于目标设备上的输入
+    """
+    import torch
+    
+    pin = torch.cuda.is_available() and torch.device(device).type == "cuda"
+    moved = {}
+    for key, value in inputs.items():
+        if isinstance(value, torch.Tensor):
+            if pin and value.is_cpu:
+                value = value.pin_memory()
+            value = value.to(device, non_blocking=True)
+        moved[key] = value
+    return moved
+
+def sampling_kwargs(temperature: float) -> Dict[str, Any]:
+    """
+    根据温度生成generate的采样参数
+    
+    temperature<=0时走贪心解码，不传temperature，跳过logits warper及采样kernel
+    
+    Args:
+        temperature (float): 温度参数
+        
+    Returns:
+        Dict[str, Any]: 传给generate的采样相关参数
+    """
+    if temperature <= 0.0:
+        return {"do_sample": False, "num_beams": 1}
+    return {"do_sample": True, "temperature": temperature}
+
+def shared_prefix_length(previous, current) -> int:
+    """
+    计算两个一维token序列的最长公共前缀长度
+    
+    Args:
+        previous: 上一轮缓存对应的token序列(一维张量)
+        current: 本轮输入的token序列(一维张量)
+        
+    Returns:
+        int: 公共前缀长度
+    """
+    n = min(len(previous), len(current))
+    if n == 0:
+        return 0
+    equal = previous[:n] == current[:n]
+    if bool(equal.all()):
+        return n
+    # 第一个不相等的位置即为公共前缀长度
+    return int(equal.long().argmin())
+
+class PrefixKVCache:
+    """
+    多轮对话的KV缓存复用：保存上一轮的past_key_values及其对应的token序列，
+    下一轮裁剪到与新输入的最长公共前缀后传给generate，只需计算新增部分
+    """
+    
+    def __init__(self):
+        self.past = None
+        self.tokens = None
+    
+    def lookup(self, input_ids):
+        """
+        查找可复用的KV缓存，裁剪到与本轮输入的最长公共前缀
+        
+        Args:
+            input_ids: 本轮输入token，形状为 (1, seq_len)
+            
+        Returns:
+            可传给generate的past_key_values，无可复用缓存时返回None
+        """
+        if self.past is None or self.tokens is None or not hasattr(self.past, "crop"):
+            return None
+        
+        prefix_len = shared_prefix_length(self.tokens, input_ids[0].to(self.tokens.device))
+        # 至少保留一个新token参与前向计算
+        prefix_len = min(prefix_len, input_ids.shape[1] - 1)
+        if prefix_len <= 0:
+            return None
+        
+        self.past.crop(prefix_len)
+        return self.past
+    
+    def store(self, outputs) -> None:
+        """
+        保存本轮生成后的KV缓存及其对应的token序列，供下一轮复用
+        
+        Args:
+            outputs: generate(return_dict_in_generate=True)的返回结果
+        """
+        past = getattr(outputs, "past_key_values", None)
+        if past is None or not hasattr(past, "get_seq_length"):
+            self.reset()
+            return
+        self.past = past
+        self.tokens = outputs.sequences[0, :past.get_seq_length()]
+    
+    def reset(self) -> None:
+        """丢弃缓存"""
+        self.past = None
+        self.tokens = None
+
+# 超过该大小的图像在发送前按jpeg_quality重新压缩，减小base64负载
+JPEG_REENCODE_BYTES = 512 * 1024
+
+def _encode_jpeg(image: Any, quality: int) -> bytes:
+    """
+    将图像压缩为JPEG字节
+    
+    Args:
+        image (Any): 图像路径、图像字节或BGR格式的numpy帧(H, W, 3)
+        quality (int): JPEG质量(1-100)
+        
+    Returns:
+        bytes: JPEG编码后的字节
+    """
+    if hasattr(image, "shape"):
+        import cv2
+        
+        ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("JPEG编码失败")
+        return buf.tobytes()
+    
+    from io import BytesIO
+    
+    out = BytesIO()
+    load_rgb_image(image).save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
 def create_multimodal_message(
-    image: Optional[Union[str, bytes]] = None,
+    image: Optional[Union[str, bytes, Any]] = None,
     gesture: Optional[str] = None,
     gaze: Optional[tuple] = None,
-    text: Optional[str] = None
+    text: Optional[str] = None,
+    jpeg_quality: Optional[int] = 85
 ) -> Dict[str, Any]:
     """
     创建包含多模态内容的消息
     
     Args:
-        image (Optional[Union[str, bytes]]): 图像数据或路径
+        image (Optional[Union[str, bytes, Any]]): 图像数据、路径、data URL或BGR格式的numpy帧
         gesture (Optional[str]): 手势信息
         gaze (Optional[tuple]): 眼动数据 (x, y, r)
         text (Optional[str]): 用户文本输入
+        jpeg_quality (Optional[int]): 大图像及原始帧重新压缩为JPEG时的质量，为None时大图像保持原样
         
     Returns:
         Dict[str, Any]: 格式化的多模态消息
@@ -102,20 +522,49 @@ def create_multimodal_message(
         content.append({"type": "text", "text": " ".join(message_parts)})
     
     # 添加图像部分
-    if image:
-        if isinstance(image, str):
-            # 如果是路径，加载并编码图像
-            if os.path.exists(image):
+    if hasattr(image, "shape"):
+        # 原始帧，压缩为JPEG后再编码
+        jpeg_data = _encode_jpeg(image, jpeg_quality or 85)
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": f"data:image/jpeg;base64,{_b64encode_to_str(jpeg_data)}"}
+        })
+    elif image:
+        if isinstance(image, str) and image.startswith("data:"):
+            # 已经是data URL，直接透传，避免重复编码
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": image}
+            })
+        elif isinstance(image, str):
+            # 如果是路径，加载并编码图像，MIME类型按扩展名推断
+            try:
+                file_size = os.path.getsize(image)
+            except OSError:
+                # 不是可访问的文件(不存在、名称过长、中间路径不是目录等)，视为已编码的base64字符串
+                file_size = None
+            if file_size is None:
+                image_data = image
+                mime_type = "image/jpeg"
+            elif jpeg_quality and file_size > JPEG_REENCODE_BYTES:
+                image_data = _b64encode_to_str(_encode_jpeg(image, jpeg_quality))
+                mime_type = "image/jpeg"
+            else:
                 image_data = encode_image_to_base64(image)
-                content.append({
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}
-                })
+                mime_type = mimetypes.guess_type(image)[0]
+                if not mime_type or not mime_type.startswith("image/"):
+                    mime_type = "image/jpeg"
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:{mime_type};base64,{image_data}"}
+            })
         else:
-            # 假设已经是base64编码的图像
+            # 原始图像字节，编码为base64
+            if jpeg_quality and len(image) > JPEG_REENCODE_BYTES:
+                image = _encode_jpeg(image, jpeg_quality)
             content.append({
                 "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{image}"}
+                "image_url": {"url": f"data:image/jpeg;base64,{_b64encode_to_str(image)}"}
             })
     
     return {"role": "user", "content": content}
\ No newline at end of file
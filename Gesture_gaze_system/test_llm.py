@@ -4,6 +4,22 @@ import json
 from dotenv import load_dotenv
 from Gesture_gaze_system.llm import Phi4LLM, OpenAILLM
 
+# 未安装orjson时回退到标准库，测试仍可运行
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads_json(data):
+    """解析JSON字符串"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def pretty_json(obj) -> str:
+    """格式化输出JSON，保留中文字符"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
 # 加载环境变量
 load_dotenv()
 
@@ -106,9 +122,9 @@ def test_function_call(model_name):
         
         if "function_call" in response:
             func_name = response["function_call"]["name"]
-            func_args = json.loads(response["function_call"]["arguments"])
+            func_args = loads_json(response["function_call"]["arguments"])
             print(f"函数调用: {func_name}")
-            print(f"参数: {json.dumps(func_args, ensure_ascii=False, indent=2)}")
+            print(f"参数: {pretty_json(func_args)}")
         else:
             print(f"未触发函数调用，模型响应:\n{response['content']}")
         
@@ -122,9 +138,9 @@ def test_function_call(model_name):
         
         if "function_call" in response:
             func_name = response["function_call"]["name"]
-            func_args = json.loads(response["function_call"]["arguments"])
+            func_args = loads_json(response["function_call"]["arguments"])
             print(f"函数调用: {func_name}")
-            print(f"参数: {json.dumps(func_args, ensure_ascii=False, indent=2)}")
+            print(f"参数: {pretty_json(func_args)}")
         else:
             print(f"未触发函数调用，模型响应:\n{response['content']}")
         
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Gesture_gaze_system.llm import utils
+from Gesture_gaze_system.llm.utils import format_functions_for_phi
+
+
+def _function(name):
+    return {
+        "name": name,
+        "description": "获取天气",
+        "parameters": {"type": "object", "properties": {"city": {"type": "string", "description": "城市"}}},
+    }
+
+
+class FormatFunctionsCacheTest(unittest.TestCase):
+    """format_functions_for_phi: 格式化结果与有界LRU缓存"""
+
+    def setUp(self):
+        utils._FN_CACHE.clear()
+
+    def test_format(self):
+        self.assertEqual(
+            format_functions_for_phi([_function("get_weather")]),
+            "函数名称: get_weather\n描述: 获取天气\n参数:\n- city (string): 城市\n"
+        )
+
+    def test_cache_is_bounded(self):
+        first = [_function("f0")]
+        format_functions_for_phi(first)
+        for i in range(1, utils.FN_CACHE_SIZE + 10):
+            format_functions_for_phi([_function(f"f{i}")])
+        self.assertEqual(len(utils._FN_CACHE), utils.FN_CACHE_SIZE)
+        # 最早的条目已被淘汰，重新格式化结果不变
+        self.assertEqual(format_functions_for_phi(first), utils._format_functions(first))
+
+    def test_key_ignores_dict_order(self):
+        a = {"name": "f", "description": "d"}
+        b = {"description": "d", "name": "f"}
+        format_functions_for_phi([a])
+        format_functions_for_phi([b])
+        self.assertEqual(len(utils._FN_CACHE), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
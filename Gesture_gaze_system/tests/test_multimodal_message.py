@@ -0,0 +1,49 @@
+import base64
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Gesture_gaze_system.llm.utils import create_multimodal_message
+
+
+def _image_url(message):
+    """取出消息中的图像data URL"""
+    return [part for part in message["content"] if part["type"] == "image_url"][0]["image_url"]["url"]
+
+
+class CreateMultimodalMessageTest(unittest.TestCase):
+    """create_multimodal_message: 字符串图像参数按文件路径或base64处理"""
+
+    def test_long_base64_string(self):
+        # 超过文件名长度上限的base64字符串，os.path.getsize会抛出ENAMETOOLONG
+        payload = base64.b64encode(os.urandom(6 * 1024)).decode("ascii")
+        self.assertGreater(len(payload), 4096)
+        message = create_multimodal_message(image=payload, text="看这里")
+        self.assertEqual(_image_url(message), f"data:image/jpeg;base64,{payload}")
+
+    def test_base64_string_with_slash(self):
+        # 含"/"的base64可能被当作中间部分不是目录的路径(ENOTDIR)
+        with tempfile.NamedTemporaryFile() as f:
+            payload = f"{f.name}/QUJD"
+            message = create_multimodal_message(image=payload)
+        self.assertEqual(_image_url(message), f"data:image/jpeg;base64,{payload}")
+
+    def test_image_path(self):
+        data = b"\x89PNG\r\n\x1a\n" + os.urandom(32)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame.png")
+            with open(path, "wb") as f:
+                f.write(data)
+            message = create_multimodal_message(image=path)
+        self.assertEqual(_image_url(message), f"data:image/png;base64,{base64.b64encode(data).decode('ascii')}")
+
+    def test_data_url_passthrough(self):
+        url = "data:image/png;base64,QUJD"
+        self.assertEqual(_image_url(create_multimodal_message(image=url)), url)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+
+# 从仓库根目录导入Gesture_gaze_system包，llm包按需加载后端，不需要torch
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Gesture_gaze_system.llm.utils import extract_between, scan_json_objects, json_loads
+
+
+class ExtractBetweenTest(unittest.TestCase):
+    """extract_between: 工具调用标记与```json代码块的提取"""
+
+    def test_fenced_blocks(self):
+        text = '说明\n```json\n{"function": "a"}\n```\n中间\n```json\n{"function": "b"}\n```'
+        blocks = [block.strip() for block in extract_between(text, "```json", "```")]
+        self.assertEqual(blocks, ['{"function": "a"}', '{"function": "b"}'])
+
+    def test_tool_call_tags(self):
+        text = '<|tool_call|>[{"name": "f"}]<|/tool_call|>文本<|tool_call|>{"name": "g"}<|/tool_call|>'
+        self.assertEqual(
+            extract_between(text, "<|tool_call|>", "<|/tool_call|>"),
+            ['[{"name": "f"}]', '{"name": "g"}']
+        )
+
+    def test_unterminated_block_is_ignored(self):
+        self.assertEqual(extract_between('```json\n{"a": 1}', "```json", "```"), [])
+        self.assertEqual(extract_between("没有代码块", "```json", "```"), [])
+
+
+class ScanJsonObjectsTest(unittest.TestCase):
+    """scan_json_objects: 未加代码块标记的JSON对象扫描"""
+
+    def test_unfenced_objects_in_prose(self):
+        text = '我将调用 {"name": "get_weather", "arguments": {"city": "北京"}} 然后 {"name": "set_alarm"} 结束'
+        self.assertEqual(scan_json_objects(text), [
+            '{"name": "get_weather", "arguments": {"city": "北京"}}',
+            '{"name": "set_alarm"}',
+        ])
+
+    def test_nested_arguments(self):
+        text = '{"name": "f", "arguments": {"filter": {"range": {"min": 1, "max": 2}}, "tags": [{"k": "v"}]}}'
+        objects = scan_json_objects(text)
+        self.assertEqual(objects, [text])
+        self.assertEqual(json_loads(objects[0])["arguments"]["filter"]["range"]["max"], 2)
+
+    def test_braces_inside_strings(self):
+        text = '前缀 {"name": "echo", "arguments": {"text": "右括号} 和左括号{"}} 后缀 {"name": "g"}'
+        objects = scan_json_objects(text)
+        self.assertEqual(len(objects), 2)
+        self.assertEqual(json_loads(objects[0])["arguments"]["text"], "右括号} 和左括号{")
+        self.assertEqual(json_loads(objects[1]), {"name": "g"})
+
+    def test_escaped_quotes_inside_strings(self):
+        text = r'{"name": "echo", "arguments": {"text": "引号\" 与 } 与 \\"}}'
+        objects = scan_json_objects(text)
+        self.assertEqual(objects, [text])
+        self.assertEqual(json_loads(objects[0])["arguments"]["text"], '引号" 与 } 与 \\')
+
+    def test_quotes_outside_objects_do_not_affect_depth(self):
+        text = '他说"你好 {"name": "f"}'
+        self.assertEqual(scan_json_objects(text), ['{"name": "f"}'])
+
+    def test_unbalanced_braces(self):
+        self.assertEqual(scan_json_objects('} {"a": 1'), [])
+        self.assertEqual(scan_json_objects('}} {"a": 1}'), ['{"a": 1}'])
+
+
+if __name__ == "__main__":
+    unittest.main()
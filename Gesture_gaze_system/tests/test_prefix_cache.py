@@ -0,0 +1,67 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from Gesture_gaze_system.llm.utils import PrefixKVCache
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+class _FakeCache:
+    """只实现crop/get_seq_length的KV缓存替身"""
+
+    def __init__(self, length):
+        self.length = length
+
+    def crop(self, length):
+        self.length = length
+
+    def get_seq_length(self):
+        return self.length
+
+
+@unittest.skipIf(torch is None, "需要torch")
+class PrefixKVCacheTest(unittest.TestCase):
+    """PrefixKVCache: 按最长公共前缀裁剪并复用上一轮的KV缓存"""
+
+    def _store(self, cache, tokens, cached_len):
+        sequences = torch.tensor([tokens])
+        cache.store(SimpleNamespace(past_key_values=_FakeCache(cached_len), sequences=sequences))
+
+    def test_empty_cache(self):
+        self.assertIsNone(PrefixKVCache().lookup(torch.tensor([[1, 2, 3]])))
+
+    def test_crops_to_shared_prefix(self):
+        cache = PrefixKVCache()
+        self._store(cache, [1, 2, 3, 4, 5], 4)
+        past = cache.lookup(torch.tensor([[1, 2, 3, 9, 9, 9]]))
+        self.assertIsNotNone(past)
+        self.assertEqual(past.get_seq_length(), 3)
+
+    def test_keeps_one_new_token(self):
+        cache = PrefixKVCache()
+        self._store(cache, [1, 2, 3, 4], 4)
+        # 输入与缓存完全相同时仍留一个token参与前向计算
+        self.assertEqual(cache.lookup(torch.tensor([[1, 2, 3, 4]])).get_seq_length(), 3)
+
+    def test_no_shared_prefix(self):
+        cache = PrefixKVCache()
+        self._store(cache, [1, 2, 3], 3)
+        self.assertIsNone(cache.lookup(torch.tensor([[7, 8, 9]])))
+
+    def test_store_without_cache_resets(self):
+        cache = PrefixKVCache()
+        self._store(cache, [1, 2, 3], 3)
+        cache.store(SimpleNamespace(past_key_values=None, sequences=torch.tensor([[1, 2, 3]])))
+        self.assertIsNone(cache.past)
+        self.assertIsNone(cache.tokens)
+
+
+if __name__ == "__main__":
+    unittest.main()
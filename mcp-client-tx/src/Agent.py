@@ -1,5 +1,11 @@
 import json
 import asyncio  # 确保导入 asyncio
+# 优先使用orjson解析工具参数，未安装时回退到标准库
+# orjson.JSONDecodeError继承自json.JSONDecodeError，下方的异常捕获两者通用
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 from MCPClient import MCPClient
 from chat_openai import ChatOpenAI,ToolDefinition
 from utils import log_title
@@ -18,6 +24,9 @@ class Agent:
         self.system_prompt = system_prompt
         self.context = context
         self._is_initialized = False
+        # connect_all启动的客户端托管任务及其停止信号
+        self._client_tasks: List[asyncio.Task] = []
+        self._clients_stop: Optional[asyncio.Event] = None
         
     async def __aenter__(self):
         """异步上下文管理器的进入方法，初始化Agent。"""
@@ -38,9 +47,12 @@ class Agent:
         # 确保已经初始化
         
         tools=[]
+        # 工具名到所属客户端的映射，invoke中按名称O(1)查找
+        self._tool_to_client: Dict[str, MCPClient] = {}
         for mcpClient in self.mcpClient:
             tools_mcp = mcpClient.get_tools()
             for tool_mcp in tools_mcp:
+                self._tool_to_client.setdefault(tool_mcp.name, mcpClient)
                 # 确保 inputSchema 存在且是字典，否则提供默认空字典
                 input_schema = tool_mcp.inputSchema if hasattr(tool_mcp, 'inputSchema') and isinstance(tool_mcp.inputSchema, dict) else {}
                 tools.append(ToolDefinition(name=tool_mcp.name,
@@ -52,12 +64,78 @@ class Agent:
         self.llm.list_tools()
         self._is_initialized = True
 
+    async def _hold_client(self, client: MCPClient, ready: asyncio.Future, stop: asyncio.Event):
+        """在单个任务内完成客户端的连接、等待和关闭，stdio的cancel scope不会跨任务退出。"""
+        try:
+            await client.init()
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(None)
+        try:
+            await stop.wait()
+        finally:
+            await client.close()
+
+    async def connect_all(self):
+        """并发连接所有MCP客户端（含工具发现），启动耗时由各连接耗时之和降为最大值。
+
+        以此方式连接的客户端由Agent.close负责关闭；任一客户端连接失败时关闭已连接的客户端并抛出异常。
+        """
+        log_title("并发连接mcp客户端")
+        loop = asyncio.get_running_loop()
+        self._clients_stop = asyncio.Event()
+        readies = [loop.create_future() for _ in self.mcpClient]
+        self._client_tasks = [
+            asyncio.create_task(self._hold_client(client, ready, self._clients_stop))
+            for client, ready in zip(self.mcpClient, readies)
+        ]
+        results = await asyncio.gather(*readies, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            await self._close_clients()
+            raise errors[0]
+
+    async def _close_clients(self):
+        """停止connect_all启动的客户端托管任务，等待各客户端在自身任务中关闭。"""
+        if self._clients_stop is not None:
+            self._clients_stop.set()
+        if self._client_tasks:
+            await asyncio.gather(*self._client_tasks, return_exceptions=True)
+        self._client_tasks = []
+        self._clients_stop = None
+
     async def close(self):
-        """关闭Agent相关资源。MCP客户端将由外部调用者关闭。"""
+        """关闭Agent相关资源。外部创建的MCP客户端由外部调用者关闭。"""
         log_title("关闭agent资源")
-        # MCP客户端的关闭由创建它们的上下文负责，这里不再关闭它们
+        # 外部上下文创建的MCP客户端由其自身负责关闭，这里只关闭connect_all连接的客户端
+        await self._close_clients()
         self._is_initialized = False
         
+    async def _dispatch_one(self, tool_call: Dict[str, Any]):
+        """执行单个工具调用，返回 (tool_call_id, 结果文本)，异常转为错误文本。"""
+        found_client = self._tool_to_client.get(tool_call["function"]["name"])
+        if not found_client:
+            # 映射表在init时构建，客户端之后重连导致工具变化时按名称兜底查找
+            found_client = next((c for c in self.mcpClient if c.has_tool(tool_call["function"]["name"])), None)
+        if not found_client:
+            return tool_call["id"], "Tool not found"
+        log_title(f"工具使用: {tool_call['function']['name']}")
+        print(f"Calling tool: {tool_call['function']['name']} with arguments: {tool_call['function']['arguments']}")
+        try:
+            tool_result = await found_client.call_tool(
+                tool_call["function"]["name"],
+                json_loads(tool_call["function"]["arguments"])
+            )
+            print(f"Tool result: {tool_result}")
+            return tool_call["id"], str(tool_result)
+        except json.JSONDecodeError as e:
+            print(f"Tool error: {e}")
+            return tool_call["id"], f"Invalid JSON arguments: {e}"
+        except Exception as e:
+            print(f"Error calling tool {tool_call['function']['name']}: {e}")
+            return tool_call["id"], f'Error: {e}'
+        
     async def invoke(self,prompt:str):
         """调用大模型进行对话，处理工具调用。"""
         if not self._is_initialized:
@@ -72,31 +150,10 @@ class Agent:
         
         while True:
             if len(response["tool_calls"]) > 0:
-                for tool_call in response["tool_calls"]:
-                    found_client = None
-                    for client in self.mcpClient:
-                        if any(t.name == tool_call["function"]["name"] for t in client.get_tools()):
-                        #if client.get_tools().find(lambda t: t.name == tool_call.function.name):
-                            found_client = client
-                            break
-                    if found_client:
-                        log_title(f"工具使用: {tool_call['function']['name']}")
-                        print(f"Calling tool: {tool_call['function']['name']} with arguments: {tool_call['function']['arguments']}")
-                        try:
-                            tool_result = await found_client.call_tool(
-                                tool_call["function"]["name"],
-                                json.loads(tool_call["function"]["arguments"])
-                            )
-                            print(f"Tool result: {tool_result}")
-                            self.llm.append_tool_result(tool_call["id"],str(tool_result))
-                        except json.JSONDecodeError as e:
-                            print(f"Tool error: {e}")
-                            self.llm.append_tool_result(tool_call["id"],f"Invalid JSON arguments: {e}")
-                        except Exception as e:
-                            print(f"Error calling tool {tool_call['function']['name']}: {e}")
-                            self.llm.append_tool_result(tool_call["id"],f'Error: {e}')
-                    else:
-                        self.llm.append_tool_result(tool_call["id"],"Tool not found")
+                # 各工具调用相互独立，并发执行；gather按输入顺序返回结果，追加顺序不变
+                results = await asyncio.gather(*(self._dispatch_one(tool_call) for tool_call in response["tool_calls"]))
+                for tool_call_id, tool_result in results:
+                    self.llm.append_tool_result(tool_call_id, tool_result)
                 response = await self.llm.chat()
             else:
                 return response["content"]
\ No newline at end of file
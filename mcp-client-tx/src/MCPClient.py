@@ -33,6 +33,7 @@ class MCPClient:
         self.transport = None
         self.args = args
         self.tools = []
+        self._tool_names: frozenset = frozenset()
         # 延迟创建AsyncExitStack，确保它在同一个任务中创建和关闭
         self.exit_stack = None
     
@@ -74,6 +75,12 @@ class MCPClient:
         '''
         return self.tools
 
+    def has_tool(self, name: str) -> bool:
+        '''
+        判断该客户端是否提供指定名称的工具
+        '''
+        return name in self._tool_names
+
     async def call_tool(self,name:str,params:Dict[str,Any]):
         '''
         调用工具
@@ -107,6 +114,7 @@ class MCPClient:
             # 列出可用工具
             response = await self.mcp.list_tools()
             self.tools = response.tools
+            self._tool_names = frozenset(tool.name for tool in self.tools)
             print(f"\nConnected to server {self.name} with tools:", [tool.name for tool in self.tools])
         except Exception as e:
             print(f"Error connecting to server {self.name}: {e}")
@@ -0,0 +1,23 @@
+from typing import Optional
+
+import httpx
+
+# ChatOpenAI与EmbeddingRetriever共用的连接池，复用TLS连接，HTTP/2下多个请求在同一连接上多路复用
+_LIMITS = httpx.Limits(max_keepalive_connections=64, keepalive_expiry=60)
+
+_shared_client: Optional[httpx.AsyncClient] = None
+
+def get_shared_httpx() -> httpx.AsyncClient:
+    """获取进程内共享的httpx.AsyncClient，首次调用时创建
+
+    Returns:
+        httpx.AsyncClient: 可作为AsyncOpenAI的http_client传入
+    """
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        try:
+            _shared_client = httpx.AsyncClient(http2=True, limits=_LIMITS)
+        except ImportError:
+            # 未安装h2时退回HTTP/1.1，仍保留连接池
+            _shared_client = httpx.AsyncClient(limits=_LIMITS)
+    return _shared_client
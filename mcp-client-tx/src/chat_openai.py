@@ -1,9 +1,11 @@
 import os
 import json
 import asyncio
+from collections import deque
 from typing import List, Dict, Any, Optional, TypedDict, Union
-from openai import OpenAI, AsyncOpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from _http import get_shared_httpx
 
 load_dotenv()  # 加载.env文件中的环境变量
 
@@ -35,7 +37,7 @@ class ChatOpenAI:
     def __init__(self, model: str = "gpt-4o", api_key: Optional[str] = None, 
                  base_url: Optional[str] = None, system_prompt: Optional[str] = None,
                  tools: Optional[List[ToolDefinition]] = None, context: Optional[str] = None,
-                 max_tokens: Optional[int] = None):
+                 max_tokens: Optional[int] = None, max_history_turns: int = 16):
         """初始化ChatOpenAI类
         
         Args:
@@ -46,6 +48,7 @@ class ChatOpenAI:
             tools: 工具列表
             context: 上下文
             max_tokens: 最大生成token数
+            max_history_turns: 保留的最近对话轮数，每轮按2条消息计，系统消息不计入
         """
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
@@ -55,21 +58,44 @@ class ChatOpenAI:
         self.base_url = base_url
         self.system_prompt = system_prompt
         self.tools = tools or []
+        # 工具在初始化后不再变化，API格式的工具列表只构建一次
+        self._tools_api_cache: Optional[List[Dict[str, Any]]] = None
+        self._has_tools = bool(self.tools)
         self.context = context
         self.max_tokens = max_tokens
         self.temperature = 0.7
         
-        # 初始化消息历史
-        self.messages: List[Dict[str, Any]] = []
+        # 初始化消息历史：系统消息单独保存，对话历史使用有界deque，限制每次请求重发的上下文长度
+        self._system_msgs: List[Dict[str, Any]] = []
         if system_prompt:
-            self.messages.append({"role": "system", "content": system_prompt})
+            self._system_msgs.append({"role": "system", "content": system_prompt})
         if context:
-            self.messages.append({"role": "system", "content": context})
+            self._system_msgs.append({"role": "system", "content": context})
+        self._history: deque = deque(maxlen=max_history_turns * 2)
+        
+        # 每轮不变的请求参数只构建一次，chat中再合并messages和temperature
+        self._base_request_args: Dict[str, Any] = {"model": self.model}
+        if self.max_tokens:
+            self._base_request_args["max_tokens"] = self.max_tokens
+        if self._has_tools:
+            self._base_request_args["tools"] = self.get_tools_for_api()
             
-        # 初始化同步和异步客户端
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
-        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+        # 初始化异步客户端，底层使用共享的HTTP/2连接池
+        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                        http_client=get_shared_httpx())
             
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """发送给API的消息列表：系统消息 + 截断后的对话历史"""
+        if not self._history:
+            return list(self._system_msgs)
+        history = list(self._history)
+        # 截断可能切在工具调用中间，丢弃开头失去对应tool_calls的工具结果消息
+        start = 0
+        while start < len(history) and history[start]["role"] == "tool":
+            start += 1
+        return [*self._system_msgs, *history[start:]]
+
     def list_tools(self) -> None:
         """打印可用工具列表"""
         if not self.tools:
@@ -82,7 +108,9 @@ class ChatOpenAI:
             
     def get_tools_for_api(self) -> List[Dict[str, Any]]:
         """获取用于API的工具列表"""
-        return [tool.to_dict() for tool in self.tools]
+        if self._tools_api_cache is None:
+            self._tools_api_cache = [tool.to_dict() for tool in self.tools]
+        return self._tools_api_cache
             
     def append_tool_result(self, tool_call_id: str, result: str) -> None:
         """添加工具调用结果到消息历史
@@ -91,7 +119,7 @@ class ChatOpenAI:
             tool_call_id: 工具调用ID
             result: 工具调用结果
         """
-        self.messages.append({
+        self._history.append({
             "role": "tool",
             "tool_call_id": tool_call_id,
             "content": result
@@ -109,22 +137,14 @@ class ChatOpenAI:
         """
         # 如果提供了提示，将其添加到消息历史
         if prompt:
-            self.messages.append({"role": "user", "content": prompt})
+            self._history.append({"role": "user", "content": prompt})
             
-        # 构建请求参数
-        # 如果是gpt-4-turbo之前的老模型，用老参数
+        # 构建请求参数，model/max_tokens/tools已在初始化时准备好
         request_args = {
-            "model": self.model,
+            **self._base_request_args,
             "messages": self.messages,
             "temperature": temperature or self.temperature,
         }
-        
-        if self.max_tokens:
-            request_args["max_tokens"] = self.max_tokens
-            
-        # 如果有工具，添加到请求参数
-        if self.tools:
-            request_args["tools"] = self.get_tools_for_api()
             
         try:
             # 调用API
@@ -133,33 +153,67 @@ class ChatOpenAI:
             response_message = response.choices[0].message
             
             # 将助手的回复添加到消息历史
-            self.messages.append({
+            self._history.append({
                 "role": "assistant",
                 "content": response_message.content or "",
             })
             
             # 如果有工具调用，添加到消息历史
             if hasattr(response_message, 'tool_calls') and response_message.tool_calls:
-                self.messages[-1]["tool_calls"] = response_message.tool_calls
+                self._history[-1]["tool_calls"] = response_message.tool_calls
                 
-            # 构建返回结果
-            result = {
-                "content": response_message.content,
-                "tool_calls": []
-            }
-            
-            # 如果有工具调用，格式化返回
-            if hasattr(response_message, 'tool_calls') and response_message.tool_calls:
-                for tool_call in response_message.tool_calls:
-                    result["tool_calls"].append({
-                        "id": tool_call.id,
-                        "function": {
-                            "name": tool_call.function.name,
-                            "arguments": tool_call.function.arguments
-                        }
-                    })
-                    
-            return result
+            return self._format_response(response_message)
         except Exception as e:
             print(f"OpenAI API调用失败: {e}")
-            return {"content": f"Error: {e}", "tool_calls": []}
\ No newline at end of file
+            return {"content": f"Error: {e}", "tool_calls": []}
+
+    def _format_response(self, response_message) -> Dict[str, Any]:
+        """将API返回的消息转换为chat的返回格式"""
+        # 构建返回结果
+        result = {
+            "content": response_message.content,
+            "tool_calls": []
+        }
+        
+        # 如果有工具调用，格式化返回
+        if hasattr(response_message, 'tool_calls') and response_message.tool_calls:
+            for tool_call in response_message.tool_calls:
+                result["tool_calls"].append({
+                    "id": tool_call.id,
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments
+                    }
+                })
+                
+        return result
+
+    async def chat_batch(self, prompts: List[str], temperature: Optional[float] = None) -> List[Dict[str, Any]]:
+        """并发发送多个相互独立的提示，每个提示基于当前上下文单独请求，不写入消息历史
+        
+        OpenAI的chat接口没有服务端批处理，这里用asyncio.gather并发发起请求；
+        共享的HTTP/2连接池下多个请求在同一连接上多路复用，效果最好
+        
+        Args:
+            prompts: 用户提示列表
+            temperature: 温度参数，控制随机性
+            
+        Returns:
+            List[Dict[str, Any]]: 与prompts顺序一致的模型响应
+        """
+        base_messages = self.messages
+        
+        async def _one(prompt: str) -> Dict[str, Any]:
+            request_args = {
+                **self._base_request_args,
+                "messages": [*base_messages, {"role": "user", "content": prompt}],
+                "temperature": temperature or self.temperature,
+            }
+            try:
+                response = await self.async_client.chat.completions.create(**request_args)
+                return self._format_response(response.choices[0].message)
+            except Exception as e:
+                print(f"OpenAI API调用失败: {e}")
+                return {"content": f"Error: {e}", "tool_calls": []}
+        
+        return list(await asyncio.gather(*(_one(prompt) for prompt in prompts)))
\ No newline at end of file
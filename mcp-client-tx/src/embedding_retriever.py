@@ -3,9 +3,10 @@ import json
 import asyncio
 import numpy as np
 from typing import List, Dict, Any, Optional, Union
-from openai import AsyncOpenAI, OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from vector_store import VectorStore
+from _http import get_shared_httpx
 
 load_dotenv()  # load environment variables from .env
 
@@ -45,19 +46,20 @@ class EmbeddingRetriever:
         self.model = model
         self.top_k = top_k
         self.vector_store = vector_store or VectorStore()
+        # 嵌入向量统一使用float32连续数组，相似度计算可直接走BLAS
+        self._dtype = np.float32
         
-        # 初始化OpenAI客户端
-        self.client = OpenAI(api_key=self.api_key)
-        self.async_client = AsyncOpenAI(api_key=self.api_key)
+        # 初始化OpenAI客户端，与ChatOpenAI共用HTTP/2连接池
+        self.async_client = AsyncOpenAI(api_key=self.api_key, http_client=get_shared_httpx())
     
-    async def get_embedding(self, text: str) -> List[float]:
+    async def get_embedding(self, text: str) -> np.ndarray:
         """获取文本的嵌入向量
         
         Args:
             text: 输入文本
             
         Returns:
-            List[float]: 嵌入向量
+            np.ndarray: float32嵌入向量
         """
         # 限制文本长度，避免超出API限制
         text = text[:8000]  # 根据模型的具体限制调整
@@ -67,11 +69,41 @@ class EmbeddingRetriever:
                 input=text,
                 model=self.model
             )
-            return response.data[0].embedding
+            return np.asarray(response.data[0].embedding, dtype=self._dtype)
         except Exception as e:
             print(f"获取嵌入失败: {e}")
             # 返回一个全零向量作为后备
-            return [0.0] * 1536  # 模型的向量维度
+            return np.zeros(1536, dtype=self._dtype)  # 模型的向量维度
+
+    async def get_embeddings(self, texts: List[str], batch_size: int = 128) -> List[np.ndarray]:
+        """批量获取文本的嵌入向量，每批只发起一次API请求
+        
+        Args:
+            texts: 输入文本列表
+            batch_size: 每次请求包含的文本数量
+            
+        Returns:
+            List[np.ndarray]: 与输入顺序一致的float32嵌入向量列表
+        """
+        embeddings: List[np.ndarray] = []
+        for start in range(0, len(texts), batch_size):
+            # 限制文本长度，避免超出API限制
+            batch = [text[:8000] for text in texts[start:start + batch_size]]
+            try:
+                response = await self.async_client.embeddings.create(
+                    input=batch,
+                    model=self.model
+                )
+                # 按index排序，保证与输入顺序一致
+                embeddings.extend(
+                    np.asarray(d.embedding, dtype=self._dtype)
+                    for d in sorted(response.data, key=lambda d: d.index)
+                )
+            except Exception as e:
+                print(f"批量获取嵌入失败: {e}")
+                # 整批返回全零向量作为后备
+                embeddings.extend(np.zeros(1536, dtype=self._dtype) for _ in batch)
+        return embeddings
 
     async def add_documents(self, documents: List[Document]) -> None:
         """将文档添加到检索器
@@ -79,11 +111,12 @@ class EmbeddingRetriever:
         Args:
             documents: 文档列表
         """
-        for document in documents:
-            # 获取文档的嵌入向量
-            document.embedding = await self.get_embedding(document.page_content)
-            # 将文档添加到向量存储
-            self.vector_store.add_document(document)
+        # 一次性批量获取所有文档的嵌入向量
+        embeddings = await self.get_embeddings([document.page_content for document in documents])
+        for document, embedding in zip(documents, embeddings):
+            document.embedding = embedding
+        # 将文档整批添加到向量存储
+        self.vector_store.add_documents(documents)
     
     async def retrieve(self, query: str) -> List[Document]:
         """检索与查询最相关的文档
@@ -94,8 +127,12 @@ class EmbeddingRetriever:
         Returns:
             List[Document]: 最相关的文档列表
         """
-        # 获取查询的嵌入向量
+        # 获取查询的嵌入向量并做L2归一化
+        # 文档向量(OpenAI嵌入本身即为单位向量)组成(N, D)矩阵时，相似度即 mat @ q
         query_embedding = await self.get_embedding(query)
+        norm = np.linalg.norm(query_embedding)
+        if norm > 0:
+            query_embedding /= norm
         
         # 从向量存储中检索最相关的文档
         results = self.vector_store.search(query_embedding, self.top_k)
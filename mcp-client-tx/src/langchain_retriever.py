@@ -1,79 +1,356 @@
 import os
+import sys
+import math
 import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# OpenMP线程空闲时让出CPU而非自旋，须在加载faiss之前设置
+os.environ.setdefault("OMP_WAIT_POLICY", "PASSIVE")
+
+import faiss
 import nest_asyncio
+import numpy as np
 from typing import List, Dict, Any, Optional, Union
 from dotenv import load_dotenv
 from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain.schema.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-# 应用nest_asyncio以在Jupyter环境中支持asyncio
-nest_asyncio.apply()
+# 仅在Jupyter/IPython中应用nest_asyncio；它会给进程内所有任务的调度增加开销，asyncio.run下不需要
+if "IPython" in sys.modules:
+    nest_asyncio.apply()
 
 # 加载环境变量
 load_dotenv()
 
+# faiss的OpenMP线程数是进程级设置，同时影响索引训练和批量添加，默认保持faiss自身的设置；
+# 并发查询已合并为一次批量search，如仍需限制检索线程可设置FAISS_OMP_THREADS
+if os.environ.get("FAISS_OMP_THREADS"):
+    faiss.omp_set_num_threads(int(os.environ["FAISS_OMP_THREADS"]))
+
+# 每次嵌入请求包含的文本块数量
+EMBED_BATCH = 256
+
+# 向量数达到该值时使用IVF倒排索引，较小的语料直接暴力搜索更快也更准确
+IVF_MIN_VECTORS = 4096
+
+# IVF训练使用的最大样本数
+IVF_TRAIN_SAMPLES = 50000
+
+# 合并并发查询的时间窗口(秒)
+QUERY_COALESCE_WINDOW = 0.005
+
+# 查询嵌入与检索结果缓存的最大条目数
+QUERY_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 1024
+
+def _check_owner(path: str) -> None:
+    """拒绝加载不属于当前用户或可被其他用户写入的文件"""
+    st = os.stat(path)
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        raise PermissionError(f"拒绝加载不属于当前用户的文件: {path}")
+    if st.st_mode & 0o022:
+        raise PermissionError(f"拒绝加载可被其他用户写入的文件: {path}")
+
+def _text_key(text: str) -> bytes:
+    """文本的内容寻址键"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+class CachedQueryEmbeddings(Embeddings):
+    """包装嵌入模型，对查询嵌入做LRU缓存，文档嵌入直接透传"""
+    
+    def __init__(self, embeddings: Embeddings, maxsize: int = QUERY_CACHE_SIZE):
+        """初始化缓存包装
+        
+        Args:
+            embeddings: 被包装的嵌入模型
+            maxsize: 缓存的最大查询数
+        """
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        # 检索在多个asyncio.to_thread工作线程中执行，缓存的读写需要加锁
+        self._lock = threading.Lock()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """批量获取查询嵌入，只对未命中缓存的查询发起一次批量请求
+        
+        Args:
+            queries: 查询文本列表
+            
+        Returns:
+            List[List[float]]: 与输入顺序一致的嵌入向量列表
+        """
+        keys = [_text_key(query) for query in queries]
+        # 结果从本地字典组装，不依赖之后可能被淘汰的缓存条目
+        found: Dict[bytes, List[float]] = {}
+        missing = {}
+        with self._lock:
+            for key, query in zip(keys, queries):
+                if key in found or key in missing:
+                    continue
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = vector
+                else:
+                    missing[key] = query
+        
+        if missing:
+            # 嵌入请求在锁外发出，不阻塞其他线程的缓存命中
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            found.update(zip(missing, vectors))
+            with self._lock:
+                for key in missing:
+                    self._cache[key] = found[key]
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+        
+        return [found[key] for key in keys]
+
 class LangChainRetriever:
     """使用LangChain和FAISS进行检索的类"""
     
     def __init__(self, 
                  embedding_model: str = "text-embedding-3-small",
                  api_key: Optional[str] = None,
-                 top_k: int = 3):
+                 top_k: int = 3,
+                 chunk_size: int = 800,
+                 chunk_overlap: int = 80,
+                 nprobe: int = 16,
+                 quantizer: Optional[str] = None):
         """初始化LangChain检索器
         
         Args:
             embedding_model: 嵌入模型名称
             api_key: OpenAI API密钥
             top_k: 返回的最相关文档数量
+            chunk_size: 文档切分的块大小(字符数)
+            chunk_overlap: 相邻块之间的重叠字符数
+            nprobe: IVF索引查询时访问的聚类数，越大召回越高、速度越慢
+            quantizer: IVF索引的向量标量量化方式，"fp16"或"int8"，None表示不量化
         """
+        if quantizer not in (None, "fp16", "int8"):
+            raise ValueError(f"不支持的量化方式: {quantizer}，可选: fp16, int8")
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("没有找到OPENAI_API_KEY，请设置环境变量或在初始化时提供")
             
         self.embedding_model = embedding_model
         self.top_k = top_k
+        self.nprobe = nprobe
+        self.quantizer = quantizer
         
-        # 初始化OpenAI嵌入
-        self.embeddings = OpenAIEmbeddings(
+        # 初始化OpenAI嵌入，重复的查询直接命中缓存
+        self.embeddings = CachedQueryEmbeddings(OpenAIEmbeddings(
             model=embedding_model,
             openai_api_key=self.api_key
+        ))
+        
+        # 检索结果缓存，键包含索引中的向量数，添加文档后自动失效
+        self._result_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+        
+        # 文档切分器，长文档切块后再嵌入
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
         )
         
         # 初始化FAISS向量存储
         self.vectorstore = None
+        # 以只读mmap方式加载的索引文件路径，添加文档前需要先读入内存
+        self._mmap_path: Optional[str] = None
+        
+        # 查询合并队列及其消费任务，首次retrieve时在当前事件循环中创建
+        self._query_queue: Optional[asyncio.Queue] = None
+        self._query_consumer: Optional[asyncio.Task] = None
+    
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """按EMBED_BATCH分批并发获取文本块的嵌入向量
+        
+        Args:
+            texts: 文本块列表
+            
+        Returns:
+            List[List[float]]: 与输入顺序一致的嵌入向量列表
+        """
+        batches = [texts[i:i + EMBED_BATCH] for i in range(0, len(texts), EMBED_BATCH)]
+        results = await asyncio.gather(*[
+            asyncio.to_thread(self.embeddings.embed_documents, batch)
+            for batch in batches
+        ])
+        return [vec for batch_vecs in results for vec in batch_vecs]
+    
+    @staticmethod
+    def _normalized(vectors: List[List[float]]) -> np.ndarray:
+        """转为连续的float32矩阵并逐行L2归一化，内积即余弦相似度"""
+        x = np.ascontiguousarray(vectors, dtype=np.float32)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        faiss.normalize_L2(x)
+        return x
+    
+    def _build_vectorstore(self, texts: List[str], xb: np.ndarray,
+                           metadatas: List[Dict[str, Any]]) -> FAISS:
+        """根据首批(已归一化的)嵌入构建FAISS向量存储
+        
+        向量在入库时归一化一次，索引直接使用内积度量，分数即余弦相似度(越大越相关)；
+        语料较大时在这批向量上训练IndexIVFFlat(nlist≈8*sqrt(N))，查询只扫描nprobe个聚类；
+        指定quantizer时改用IndexIVFScalarQuantizer，以fp16/int8存储向量，减少距离计算的内存带宽
+        
+        Args:
+            texts: 文本块列表
+            xb: 归一化后的嵌入矩阵，形状为 (N, d)
+            metadatas: 元数据列表
+            
+        Returns:
+            FAISS: 向量存储
+        """
+        n, d = xb.shape
+        if n < IVF_MIN_VECTORS:
+            index = faiss.IndexFlatIP(d)
+        else:
+            # 每个聚类至少约39个训练样本，避免faiss训练不足
+            nlist = max(1, min(int(8 * math.sqrt(n)), n // 39))
+            coarse_quantizer = faiss.IndexFlatIP(d)
+            if self.quantizer is None:
+                index = faiss.IndexIVFFlat(coarse_quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                qtype = faiss.ScalarQuantizer.QT_fp16 if self.quantizer == "fp16" else faiss.ScalarQuantizer.QT_8bit
+                index = faiss.IndexIVFScalarQuantizer(coarse_quantizer, d, nlist, qtype, faiss.METRIC_INNER_PRODUCT)
+            
+            # 语料很大时只在随机样本上训练
+            if n > IVF_TRAIN_SAMPLES:
+                sample = np.random.default_rng(0).choice(n, IVF_TRAIN_SAMPLES, replace=False)
+                index.train(xb[sample])
+            else:
+                index.train(xb)
+        
+        vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        vectorstore.add_embeddings(list(zip(texts, xb)), metadatas=metadatas)
+        return vectorstore
     
-    async def add_documents(self, documents: List[Dict[str, Any]]) -> None:
+    def _apply_search_params(self) -> None:
+        """查询前设置IVF索引的nprobe，平面索引无需设置"""
+        index = self.vectorstore.index
+        if hasattr(index, "nprobe"):
+            index.nprobe = self.nprobe
+    
+    async def add_documents(self, documents: List[Dict[str, Any]], split: bool = True) -> None:
         """将文档添加到检索器
         
         Args:
             documents: 文档列表，每个文档是一个字典，包含页面内容和元数据
+            split: 是否用text_splitter切分；调用方已切好块时传False
         """
-        # 转换为LangChain文档格式
-        langchain_docs = []
-        for doc in documents:
-            langchain_docs.append(
-                Document(
-                    page_content=doc['page_content'],
-                    metadata=doc['metadata']
-                )
-            )
+        # 转换为LangChain文档格式，局部绑定Document省去逐个的全局查找
+        _Doc = Document
+        langchain_docs = [_Doc(page_content=doc['page_content'], metadata=doc['metadata']) for doc in documents]
+        
+        # 切块后批量获取嵌入，替代FAISS内部逐文档的串行嵌入
+        chunks = self.text_splitter.split_documents(langchain_docs) if split else langchain_docs
+        if not chunks:
+            return
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        xb = self._normalized(await self._embed_texts(texts))
         
         # 将文档添加到FAISS向量存储
         if self.vectorstore is None:
             # 第一次添加文档，创建向量存储
-            loop = asyncio.get_event_loop()
-            self.vectorstore = await loop.run_in_executor(
-                None,
-                lambda: FAISS.from_documents(langchain_docs, self.embeddings)
-            )
+            self.vectorstore = await asyncio.to_thread(self._build_vectorstore, texts, xb, metadatas)
         else:
-            # 已有向量存储，添加到现有存储
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: self.vectorstore.add_documents(langchain_docs)
-            )
+            if self._mmap_path is not None:
+                # mmap加载的索引是只读的，写入前完整读入内存
+                self.vectorstore.index = await asyncio.to_thread(faiss.read_index, self._mmap_path)
+                self._mmap_path = None
+            # 已有向量存储，添加到现有存储(IVF索引沿用已训练的聚类中心)
+            await asyncio.to_thread(self.vectorstore.add_embeddings, list(zip(texts, xb)), metadatas=metadatas)
+    
+    def save(self, path: str) -> None:
+        """将索引保存到磁盘，文档内容、元数据和ID映射以JSON另存为 path + ".json"
+        
+        先写临时文件再替换，正在被mmap使用的旧文件不受影响
+        
+        Args:
+            path: 索引文件路径
+        """
+        if self.vectorstore is None:
+            raise ValueError("向量存储未初始化，没有可保存的索引")
+        
+        docstore = self.vectorstore.docstore
+        index_to_docstore_id = self.vectorstore.index_to_docstore_id
+        ids = [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))]
+        docs = {}
+        for doc_id in ids:
+            doc = docstore.search(doc_id)
+            docs[doc_id] = {"page_content": doc.page_content, "metadata": doc.metadata}
+        
+        tmp_path = f"{path}.tmp"
+        faiss.write_index(self.vectorstore.index, tmp_path)
+        os.chmod(tmp_path, 0o600)
+        fd = os.open(f"{tmp_path}.json", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "docs": docs}, f, ensure_ascii=False)
+        os.replace(f"{tmp_path}.json", f"{path}.json")
+        os.replace(tmp_path, path)
+    
+    def load(self, path: str, mmap: bool = True) -> None:
+        """从磁盘加载save保存的索引，替代重新嵌入和建索引
+        
+        Args:
+            path: 索引文件路径
+            mmap: 是否以只读mmap方式加载，向量按需从页缓存读取；不支持mmap的索引类型自动回退为完整读入
+        """
+        meta_path = f"{path}.json"
+        _check_owner(path)
+        _check_owner(meta_path)
+        
+        index = None
+        if mmap:
+            try:
+                index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                index = None
+        self._mmap_path = path if index is not None else None
+        if index is None:
+            index = faiss.read_index(path)
+        
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        docstore = InMemoryDocstore({
+            doc_id: Document(page_content=doc["page_content"], metadata=doc["metadata"])
+            for doc_id, doc in meta["docs"].items()
+        })
+        
+        self.vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=dict(enumerate(meta["ids"])),
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        self._result_cache.clear()
     
     async def retrieve(self, query: str) -> List[Dict[str, Any]]:
         """检索与查询最相关的文档
@@ -87,23 +364,117 @@ class LangChainRetriever:
         if self.vectorstore is None:
             return []
         
-        # 执行相似度搜索
-        loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(
-            None,
-            lambda: self.vectorstore.similarity_search_with_score(query, k=self.top_k)
-        )
+        cache_key = (_text_key(query), self.top_k, self.vectorstore.index.ntotal)
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            self._result_cache.move_to_end(cache_key)
+            return [dict(result) for result in cached]
         
-        # 格式化返回结果
-        formatted_results = []
-        for doc, score in results:
-            formatted_results.append({
-                'page_content': doc.page_content,
-                'metadata': doc.metadata,
-                'score': float(score)  # 将numpy.float64转换为Python float
-            })
+        # 交给合并队列，与时间窗口内的其他查询一起嵌入和搜索
+        loop = asyncio.get_running_loop()
+        if self._query_consumer is None or self._query_consumer.done() or self._query_consumer.get_loop() is not loop:
+            self._query_queue = asyncio.Queue()
+            self._query_consumer = loop.create_task(self._consume_queries())
+        future = loop.create_future()
+        self._query_queue.put_nowait((query, future))
+        results = await future
+        
+        self._result_cache[cache_key] = results
+        while len(self._result_cache) > RESULT_CACHE_SIZE:
+            self._result_cache.popitem(last=False)
+        return [dict(result) for result in results]
+    
+    async def retrieve_many(self, queries: List[str]) -> List[List[Dict[str, Any]]]:
+        """批量检索多个查询：一次批量嵌入、一次index.search
+        
+        Args:
+            queries: 查询文本列表
             
-        return formatted_results
+        Returns:
+            List[List[Dict[str, Any]]]: 与queries顺序一致的检索结果
+        """
+        if self.vectorstore is None or not queries:
+            return [[] for _ in queries]
+        
+        return await asyncio.to_thread(self._search_batch, queries)
+    
+    async def aclose(self) -> None:
+        """停止查询合并的消费者任务，未完成的查询以CancelledError结束"""
+        consumer, self._query_consumer = self._query_consumer, None
+        queue, self._query_queue = self._query_queue, None
+        if consumer is None:
+            return
+        consumer.cancel()
+        try:
+            await consumer
+        except asyncio.CancelledError:
+            pass
+        # 取消仍在排队、尚未被消费者取走的查询
+        while queue is not None and not queue.empty():
+            _, future = queue.get_nowait()
+            future.cancel()
+    
+    async def _consume_queries(self) -> None:
+        """单消费者：收集QUERY_COALESCE_WINDOW内到达的查询，一次批量嵌入、一次index.search"""
+        loop = asyncio.get_running_loop()
+        queue = self._query_queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + QUERY_COALESCE_WINDOW
+            try:
+                while True:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                
+                results = await asyncio.to_thread(self._search_batch, [query for query, _ in batch])
+            except asyncio.CancelledError:
+                # aclose()取消了消费者：已取出的查询也一并取消，避免调用方永远等待
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+    
+    def _search_batch(self, queries: List[str]) -> List[List[Dict[str, Any]]]:
+        """批量嵌入查询并在索引上做一次批量搜索
+        
+        Args:
+            queries: 查询文本列表
+            
+        Returns:
+            List[List[Dict[str, Any]]]: 每个查询的最相关文档列表
+        """
+        xq = self._normalized(self.embeddings.embed_queries(queries))
+        self._apply_search_params()
+        distances, indices = self.vectorstore.index.search(xq, self.top_k)
+        
+        # 格式化返回结果
+        index_to_docstore_id = self.vectorstore.index_to_docstore_id
+        docstore = self.vectorstore.docstore
+        batch_results = [None] * len(queries)
+        for row, (row_distances, row_indices) in enumerate(zip(distances.tolist(), indices.tolist())):
+            # -1表示候选不足top_k时的空位
+            docs = [(score, docstore.search(index_to_docstore_id[i])) for score, i in zip(row_distances, row_indices) if i != -1]
+            batch_results[row] = [
+                {
+                    'page_content': doc.page_content,
+                    'metadata': doc.metadata,
+                    'score': score  # 余弦相似度，tolist()已转换为Python float
+                }
+                for score, doc in docs
+            ]
+        return batch_results
     
     # 以下是为了方便调试和查看索引信息的方法
     
@@ -121,7 +492,8 @@ class LangChainRetriever:
             return {
                 "文档数量": index.ntotal,
                 "维度": index.d,
-                "索引类型": str(type(index))
+                "索引类型": str(type(index)),
+                "量化方式": self.quantizer if hasattr(index, "sq") else None
             }
         except Exception as e:
             return {"错误": str(e)}
@@ -141,18 +513,17 @@ class LangChainRetriever:
             
         k = top_k or self.top_k
         
-        loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(
-            None,
-            lambda: self.vectorstore.similarity_search_by_vector(vector, k=k)
+        self._apply_search_params()
+        results = await asyncio.to_thread(
+            self.vectorstore.similarity_search_by_vector, self._normalized(vector)[0], k=k
         )
         
         # 格式化返回结果
-        formatted_results = []
-        for doc in results:
-            formatted_results.append({
+        formatted_results = [None] * len(results)
+        for i, doc in enumerate(results):
+            formatted_results[i] = {
                 'page_content': doc.page_content,
                 'metadata': doc.metadata
-            })
+            }
             
         return formatted_results
\ No newline at end of file
@@ -1,6 +1,8 @@
 import asyncio
 import datetime
+import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor
 from openai import OpenAI
 from chat_openai import ChatOpenAI
 from MCPClient import MCPClient
@@ -8,6 +10,61 @@ from Agent import Agent
 from vector_store import VectorStore
 from embedding_retriever import EmbeddingRetriever, Document
 from langchain_retriever import LangChainRetriever
+from utils import install_resize_handler
+
+# 读取文件时每次os.read的字节数
+READ_CHUNK = 1 << 20
+
+def _read_text(file_path):
+    """以os.open+os.read分块读取整个文件并解码为UTF-8文本
+
+    Linux下先以POSIX_FADV_SEQUENTIAL提示内核加大预读
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        str: 文件内容
+    """
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        size = os.fstat(fd).st_size
+        buf = bytearray(size)
+        view = memoryview(buf)
+        offset = 0
+        while offset < size:
+            n = os.readv(fd, [view[offset:offset + READ_CHUNK]])
+            if n == 0:
+                break
+            offset += n
+        # 读取期间文件可能被截断，只解码实际读到的部分
+        return view[:offset].tobytes().decode('utf-8') if offset < size else buf.decode('utf-8')
+    finally:
+        os.close(fd)
+
+def _read_and_split(file_path, chunk_size=800, chunk_overlap=80):
+    """读取文件并切分为文本块，在子进程中执行
+
+    Args:
+        file_path: 文件路径
+        chunk_size: 块大小(字符数)
+        chunk_overlap: 相邻块之间的重叠字符数
+
+    Returns:
+        List[Dict]: 文本块列表，每项包含page_content和metadata
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    content = _read_text(file_path)
+    # 提取文件名作为元数据
+    filename = os.path.basename(file_path)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [
+        {'page_content': chunk, 'metadata': {'source': filename, 'path': file_path}}
+        for chunk in splitter.split_text(content)
+    ]
 
 async def test_chat():
     """测试基本的聊天功能"""
@@ -103,28 +160,55 @@ async def test_agent_fetch_and_save():
         print("Agent测试失败:", str(e))
         return []
 
-async def rag_query_person(file_paths, query_name):
-    """使用两种RAG方式对人名进行查询"""
+def _index_cache_path(file_paths, embedding_model="text-embedding-3-small"):
+    """根据文件路径、修改时间和嵌入模型计算LangChain索引的缓存路径
+
+    Returns:
+        Optional[str]: 缓存文件路径，任一文件不存在时返回None
+    """
+    try:
+        key = ",".join(f"{p}:{os.path.getmtime(p)}" for p in file_paths)
+    except OSError:
+        return None
+    sig = hashlib.blake2b(f"{embedding_model}|{key}".encode("utf-8"), digest_size=16).hexdigest()
+    # 缓存放在仅当前用户可访问的目录中，避免其他用户预先放置索引文件
+    cache_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+        "mcp-client-tx", "rag"
+    )
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    os.chmod(cache_dir, 0o700)
+    return os.path.join(cache_dir, f"rag_{sig}.faiss")
+
+def _print_preview(i, source, content):
+    """打印单条检索结果的来源和内容预览"""
+    print(f"\n结果 {i+1}: 来自 {source}")
+    # 只显示内容的前200个字符，避免输出过长
+    content_preview = content[:200] + "..." if len(content) > 200 else content
+    print(f"内容预览: {content_preview}")
+
+async def rag_query_person(file_paths, query_names):
+    """使用两种RAG方式对多个人名进行查询，文档只嵌入一次，查询批量检索"""
     if not file_paths:
         print("没有文件可供查询")
         return
     
-    print(f"\n\n===== 对 '{query_name}' 进行RAG查询 =====")
+    print(f"\n\n===== 对 {', '.join(repr(name) for name in query_names)} 进行RAG查询 =====")
+    queries = [f"请详细介绍{query_name}的生平和成就" for query_name in query_names]
     
-    # 准备文档数据
+    # 准备文档数据：文件读取与切分是CPU密集的同步操作，在进程池中并行执行，避免阻塞事件循环
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1)) as pool:
+        results = await asyncio.gather(
+            *[loop.run_in_executor(pool, _read_and_split, file_path) for file_path in file_paths],
+            return_exceptions=True
+        )
     documents = []
-    for file_path in file_paths:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                # 提取文件名作为元数据
-                filename = os.path.basename(file_path)
-                documents.append({
-                    'page_content': content,
-                    'metadata': {'source': filename, 'path': file_path}
-                })
-        except Exception as e:
-            print(f"读取文件 {file_path} 失败: {e}")
+    for file_path, result in zip(file_paths, results):
+        if isinstance(result, Exception):
+            print(f"读取文件 {file_path} 失败: {result}")
+        else:
+            documents.extend(result)
     
     if not documents:
         print("没有可用的文档内容")
@@ -141,35 +225,45 @@ async def rag_query_person(file_paths, query_name):
         await retriever.add_documents(docs)
         
         # 执行检索
-        results = await retriever.retrieve(f"请详细介绍{query_name}的生平和成就")
+        all_results = await asyncio.gather(*[retriever.retrieve(query) for query in queries])
         
-        for i, doc in enumerate(results):
-            print(f"\n结果 {i+1}: 来自 {doc.metadata.get('source', '未知来源')}")
-            # 只显示内容的前200个字符，避免输出过长
-            content_preview = doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-            print(f"内容预览: {content_preview}")
+        for query_name, results in zip(query_names, all_results):
+            print(f"\n[{query_name}]")
+            for i, doc in enumerate(results):
+                _print_preview(i, doc.metadata.get('source', '未知来源'), doc.page_content)
     except Exception as e:
         print(f"原始检索器失败: {e}")
     
     # 2. 使用LangChain检索器
     print("\n----- LangChain检索器结果 -----")
+    retriever = None
     try:
         retriever = LangChainRetriever(top_k=2)
         
-        # 添加文档
-        await retriever.add_documents(documents)
+        # 文件未变化时直接加载上次保存的索引，省去全部嵌入和建索引的开销
+        index_path = _index_cache_path(file_paths, retriever.embedding_model)
+        if index_path and os.path.exists(index_path) and os.path.exists(f"{index_path}.json"):
+            retriever.load(index_path)
+        else:
+            # 添加文档
+            # 文档已在进程池中切分，不再重复切分
+            await retriever.add_documents(documents, split=False)
+            if index_path:
+                retriever.save(index_path)
         
-        # 执行检索
-        results = await retriever.retrieve(f"请详细介绍{query_name}的生平和成就")
+        # 执行检索：所有查询一次嵌入、一次index.search
+        all_results = await retriever.retrieve_many(queries)
         
-        for i, result in enumerate(results):
-            print(f"\n结果 {i+1}: 来自 {result['metadata'].get('source', '未知来源')}")
-            # 只显示内容的前200个字符，避免输出过长
-            content_preview = result['page_content'][:200] + "..." if len(result['page_content']) > 200 else result['page_content']
-            print(f"内容预览: {content_preview}")
-            print(f"相关性分数: {result['score']}")
+        for query_name, results in zip(query_names, all_results):
+            print(f"\n[{query_name}]")
+            for i, result in enumerate(results):
+                _print_preview(i, result['metadata'].get('source', '未知来源'), result['page_content'])
+                print(f"相关性分数: {result['score']}")
     except Exception as e:
         print(f"LangChain检索器失败: {e}")
+    finally:
+        if retriever is not None:
+            await retriever.aclose()
 
 async def main():
     """运行所有测试"""
@@ -179,13 +273,11 @@ async def main():
     file_paths = await test_agent_fetch_and_save()
     
     if file_paths:
-        # 2. 使用两种RAG方式查询"刘慈欣"
-        await rag_query_person(file_paths, "mcp")
-        
-        # 3. 使用两种RAG方式查询"梁启超"
-        await rag_query_person(file_paths, "梁启超")
+        # 2. 使用两种RAG方式批量查询"mcp"和"梁启超"
+        await rag_query_person(file_paths, ["mcp", "梁启超"])
     
     print("\n任务完成")
 
 if __name__ == "__main__":
+    install_resize_handler()
     asyncio.run(main())
\ No newline at end of file
@@ -1,16 +1,70 @@
 import json
 import os
 import time
-from typing import Any, Dict, List, Optional, Union, Callable
+import atexit
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Union, Callable
 
 import httpx
 
+# 请求体编码与流式事件解码优先使用orjson，未安装时回退到标准库
+# orjson.JSONDecodeError继承自json.JSONDecodeError，异常捕获两者通用
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    _loads = json.loads
+
 from .mcp_settings import MCPSettings, ModelSettings, SystemRole
+from .mcp_client._sse import SSESplitter
+
+
+@lru_cache(maxsize=128)
+def _system_message(role: str, content: str) -> Dict[str, str]:
+    """同一系统提示词只构建一次消息字典，调用方不应修改返回值"""
+    return {"role": role, "content": content}
 
 
 class MCPClient:
     """Anthropic API客户端"""
     
+    # 所有实例共用的HTTP/2连接池，最后一个实例关闭或进程退出时关闭
+    _shared_client: Optional[httpx.Client] = None
+    # 持有共享连接池的实例数
+    _users: int = 0
+    _atexit_registered: bool = False
+    
+    @classmethod
+    def _get_shared_client(cls) -> httpx.Client:
+        """获取共享的httpx.Client，首次调用时创建"""
+        if cls._shared_client is None or cls._shared_client.is_closed:
+            kwargs = {
+                "timeout": httpx.Timeout(120.0, connect=5.0),
+                "limits": httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            }
+            try:
+                cls._shared_client = httpx.Client(http2=True, **kwargs)
+            except ImportError:
+                # 未安装h2时退回HTTP/1.1，仍保留连接池
+                cls._shared_client = httpx.Client(**kwargs)
+            if not cls._atexit_registered:
+                # 只注册一次，退出时关闭届时存在的共享连接池
+                atexit.register(cls.shutdown)
+                cls._atexit_registered = True
+        return cls._shared_client
+    
+    @classmethod
+    def shutdown(cls) -> None:
+        """关闭共享连接池；之后新建的实例会重新创建连接池"""
+        client, cls._shared_client = cls._shared_client, None
+        cls._users = 0
+        if client is not None and not client.is_closed:
+            client.close()
+    
     def __init__(self, settings: Optional[MCPSettings] = None):
         """
         初始化客户端
@@ -19,18 +73,62 @@ class MCPClient:
             settings: 可选的MCPSettings实例。如果为None，将从配置文件加载
         """
         self.settings = settings or MCPSettings.from_config()
-        self._client = httpx.Client(timeout=120.0)
+        self._client = None
         
         # 检查API密钥是否已设置
         if not self.settings.api_key:
             raise ValueError("API密钥未设置。请设置环境变量ANTHROPIC_API_KEY或在配置文件中提供api_key")
+        
+        self._client = self._get_shared_client()
+        type(self)._users += 1
+        
+        # 请求头只在API密钥变化时重建
+        self._headers_key: Optional[str] = None
+        self._headers: Mapping[str, str] = MappingProxyType({})
+    
+    def _prepare_headers(self) -> Mapping[str, str]:
+        """准备请求头，返回缓存的只读字典"""
+        if self._headers_key != self.settings.api_key:
+            self._headers_key = self.settings.api_key
+            self._headers = MappingProxyType({
+                "Content-Type": "application/json",
+                "x-api-key": self.settings.api_key,
+                "anthropic-version": "2023-06-01"
+            })
+        return self._headers
     
-    def _prepare_headers(self) -> Dict[str, str]:
-        """准备请求头"""
+    def _build_payload(self,
+                       model_name: str,
+                       messages: List[Dict[str, str]],
+                       stream: bool,
+                       temperature: Optional[float],
+                       top_p: Optional[float],
+                       max_tokens: Optional[int]) -> Dict[str, Any]:
+        """
+        构建请求体，未指定的采样参数取模型配置
+        
+        Args:
+            model_name: 模型名称
+            messages: 消息列表
+            stream: 是否使用流式响应
+            temperature: 温度
+            top_p: top-p值
+            max_tokens: 最大标记数
+            
+        Returns:
+            请求体字典
+        """
+        model_settings = self.settings.models.get(model_name)
+        if model_settings is None:
+            model_settings = ModelSettings(name=model_name)
+        
         return {
-            "Content-Type": "application/json",
-            "x-api-key": self.settings.api_key,
-            "anthropic-version": "2023-06-01"
+            "model": model_name,
+            "messages": messages,
+            "stream": stream,
+            "temperature": temperature if temperature is not None else model_settings.temperature,
+            "top_p": top_p if top_p is not None else model_settings.top_p,
+            "max_tokens": max_tokens if max_tokens is not None else model_settings.max_tokens
         }
     
     def _prepare_messages(self, 
@@ -52,10 +150,7 @@ class MCPClient:
         
         # 添加系统消息
         if system_prompt:
-            messages.append({
-                "role": self.settings.system_role.value,
-                "content": system_prompt
-            })
+            messages.append(_system_message(self.settings.system_role.value, system_prompt))
         
         # 添加历史消息
         if history:
@@ -90,18 +185,7 @@ class MCPClient:
         Returns:
             API响应
         """
-        model_settings = self.settings.models.get(model_name)
-        if not model_settings:
-            model_settings = ModelSettings(name=model_name)
-        
-        payload = {
-            "model": model_name,
-            "messages": messages,
-            "stream": stream,
-            "temperature": temperature if temperature is not None else model_settings.temperature,
-            "top_p": top_p if top_p is not None else model_settings.top_p,
-            "max_tokens": max_tokens if max_tokens is not None else model_settings.max_tokens
-        }
+        payload = self._build_payload(model_name, messages, stream, temperature, top_p, max_tokens)
         
         headers = self._prepare_headers()
         
@@ -109,10 +193,10 @@ class MCPClient:
             response = self._client.post(
                 f"{self.settings.api_url}/v1/messages",
                 headers=headers,
-                json=payload
+                content=_dumps(payload)
             )
             response.raise_for_status()
-            return response.json()
+            return _loads(response.content)
         except httpx.HTTPStatusError as e:
             error_info = ""
             try:
@@ -137,32 +221,58 @@ class MCPClient:
         Returns:
             完整响应文本
         """
-        full_text = ""
+        parts: List[str] = []
+        splitter = SSESplitter()
         
         try:
-            for line in response.iter_lines():
-                if not line or line.startswith(b":"):
-                    continue
-                
-                if line.startswith(b"data: "):
-                    data_str = line[6:].decode("utf-8")
-                    if data_str.strip() == "[DONE]":
-                        break
-                    
-                    try:
-                        data = json.loads(data_str)
-                        if "content" in data and len(data["content"]) > 0:
-                            delta = data["content"][0].get("text", "")
-                            full_text += delta
-                            
-                            if callback:
-                                callback(delta)
-                    except json.JSONDecodeError:
-                        pass
+            # 直接按字节分帧：事件以空行分隔(兼容\r\n行尾)，只解析其中的data:行
+            for chunk in response.iter_bytes(8192):
+                for event in splitter.feed(chunk):
+                    if self._handle_stream_event(event, parts, callback):
+                        return "".join(parts)
+            # 流结束时处理没有以空行结尾的最后一个事件
+            event = splitter.flush()
+            if event is not None:
+                self._handle_stream_event(event, parts, callback)
         except Exception as e:
             raise Exception(f"处理流式响应出错: {str(e)}")
         
-        return full_text
+        return "".join(parts)
+    
+    def _handle_stream_event(self,
+                             event: bytes,
+                             parts: List[str],
+                             callback: Optional[Callable[[str], None]] = None) -> bool:
+        """
+        处理单个SSE事件
+        
+        Args:
+            event: 一个完整事件的原始字节(不含结尾空行)
+            parts: 累积的响应文本片段
+            callback: 处理每个部分响应的回调函数
+            
+        Returns:
+            收到[DONE]时返回True
+        """
+        for line in event.split(b"\n"):
+            if not line.startswith(b"data:"):
+                continue
+            
+            data_bytes = line[5:].strip()
+            if data_bytes == b"[DONE]":
+                return True
+            
+            try:
+                data = _loads(data_bytes)
+            except json.JSONDecodeError:
+                continue
+            if "content" in data and len(data["content"]) > 0:
+                delta = data["content"][0].get("text", "")
+                if delta:
+                    parts.append(delta)
+                    if callback:
+                        callback(delta)
+        return False
     
     def generate(self,
                prompt: str,
@@ -197,23 +307,14 @@ class MCPClient:
         # 如果使用流式响应
         if stream:
             headers = self._prepare_headers()
-            model_settings = self.settings.models.get(model_name, ModelSettings(name=model_name))
-            
-            payload = {
-                "model": model_name,
-                "messages": messages,
-                "stream": True,
-                "temperature": temperature if temperature is not None else model_settings.temperature,
-                "top_p": top_p if top_p is not None else model_settings.top_p,
-                "max_tokens": max_tokens if max_tokens is not None else model_settings.max_tokens
-            }
+            payload = self._build_payload(model_name, messages, True, temperature, top_p, max_tokens)
             
             try:
                 with self._client.stream(
                     "POST",
                     f"{self.settings.api_url}/v1/messages",
                     headers=headers,
-                    json=payload,
+                    content=_dumps(payload),
                     timeout=300.0
                 ) as response:
                     response.raise_for_status()
@@ -242,9 +343,17 @@ class MCPClient:
         return response["content"][0]["text"]
     
     def close(self):
-        """关闭客户端"""
-        if self._client:
-            self._client.close()
+        """关闭客户端。底层连接池为所有实例共享，最后一个实例关闭时关闭连接池"""
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        cls = type(self)
+        if client is not cls._shared_client:
+            # 连接池已被shutdown替换，旧连接池已关闭
+            return
+        cls._users -= 1
+        if cls._users <= 0:
+            cls.shutdown()
     
     def __enter__(self):
         return self
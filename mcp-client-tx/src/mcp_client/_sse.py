@@ -0,0 +1,55 @@
+from typing import List, Optional
+
+
+# 两个Anthropic客户端共用的SSE分帧实现
+class SSESplitter:
+    """增量切分SSE字节流：统一\r\n、\r行尾为\n后按空行分出完整事件"""
+
+    def __init__(self):
+        self.buf = bytearray()
+        # 上一块以\r结尾时暂不处理，等下一块确认是否为\r\n
+        self._pending_cr = False
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        追加一块数据，返回其中所有完整的事件(不含结尾空行)
+
+        参数:
+            chunk: 新收到的字节
+
+        返回:
+            完整事件列表，不完整部分留在缓冲区
+        """
+        if self._pending_cr:
+            chunk = b"\r" + chunk
+            self._pending_cr = False
+        if chunk.endswith(b"\r"):
+            chunk = chunk[:-1]
+            self._pending_cr = True
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        buf = self.buf
+        buf += chunk
+        events = []
+        start = 0
+        while (end := buf.find(b"\n\n", start)) != -1:
+            events.append(bytes(buf[start:end]))
+            start = end + 2
+        if start:
+            del buf[:start]
+        return events
+
+    def flush(self) -> Optional[bytes]:
+        """流结束时取出没有以空行结尾的最后一个事件"""
+        if self._pending_cr:
+            # 流以\r结束时不会再有\n，按行尾处理；补上的行尾可能正好结束最后一个事件
+            self._pending_cr = False
+            self.buf += b"\n"
+            if self.buf.endswith(b"\n\n"):
+                del self.buf[-2:]
+        if not self.buf.strip():
+            self.buf.clear()
+            return None
+        event = bytes(self.buf)
+        self.buf.clear()
+        return event
@@ -1,11 +1,214 @@
 import json
 import time
-from typing import Dict, List, Optional, Union, AsyncIterator, Iterator, Any
+import random
+import asyncio
+import weakref
+import warnings
+from email.utils import parsedate_to_datetime
+from types import MappingProxyType
+from typing import Dict, List, Optional, Set, Union, AsyncIterator, Iterator, Any
 
 import httpx
 
+from ._sse import SSESplitter
+
+# 请求体编码与流式事件解码优先使用orjson，未安装时回退到标准库
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    _loads = json.loads
+
+# 连接池上限：突发请求复用keep-alive连接，分摊TLS/TCP握手
+_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_connections=100, keepalive_expiry=30)
+
+
+# 所有实例共用的异步连接池(含并发准入控制器)，按事件循环分别创建：
+# httpx.AsyncClient和asyncio.Condition都绑定首次使用它们的事件循环，多次asyncio.run不能共用
+_POOLS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _AsyncPool]" = weakref.WeakKeyDictionary()
+# 同步close中发起的连接池关闭任务，保留引用直到完成
+_CLOSING: Set[asyncio.Task] = set()
+_SEM_SIZE = 64
+
+
+def _make_client(client_cls, limits: httpx.Limits = _LIMITS, **kwargs):
+    """创建启用HTTP/2的httpx客户端，未安装h2(httpx[http2])时退回HTTP/1.1"""
+    try:
+        return client_cls(http2=True, limits=limits, **kwargs)
+    except ImportError:
+        return client_cls(limits=limits, **kwargs)
+
+
+# 可重试的HTTP状态码，其余4xx/5xx直接抛出
+_RETRY_STATUS = frozenset({429, 502, 503, 504})
+
+# 单次重试等待的上限(秒)，同时约束退避时间和服务端给出的Retry-After
+_BACKOFF_CAP = 30.0
+
+
+def _backoff(attempt: int, base: float = 0.5, cap: float = _BACKOFF_CAP) -> float:
+    """全抖动指数退避：在[0, min(cap, base*2^attempt)]内均匀取值，错开并发客户端的重试时刻"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_delay(error: httpx.HTTPError, attempt: int) -> Optional[float]:
+    """
+    计算重试前的等待时间
+
+    参数:
+        error: 本次请求的异常
+        attempt: 当前尝试次数(从0开始)
+
+    返回:
+        等待秒数，不应重试时返回None
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        if error.response.status_code not in _RETRY_STATUS:
+            return None
+        # 服务端给出Retry-After时优先遵循，支持秒数和HTTP日期两种格式，不超过_BACKOFF_CAP
+        retry_after = error.response.headers.get("retry-after")
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError, OverflowError):
+                    delay = None
+            if delay is not None and delay == delay:
+                return min(_BACKOFF_CAP, max(0.0, delay))
+    elif not isinstance(error, httpx.TransportError):
+        # 超时、连接失败等传输层错误可重试，解码错误等不重试
+        return None
+    return _backoff(attempt)
+
+
+# 流式响应每次读取的字节数
+_SSE_CHUNK = 65536
+
+
+def _event_data(event: bytes) -> Iterator[Any]:
+    """解析单个SSE事件中的data:行，跳过[DONE]"""
+    for line in event.split(b"\n"):
+        if line.startswith(b"data:"):
+            payload = line[5:].strip()
+            if payload and payload != b"[DONE]":
+                yield _loads(payload)
+
+
+def _iter_sse(response: httpx.Response) -> Iterator[Any]:
+    """按字节增量解析同步流式响应，逐个产出data:中的JSON对象"""
+    splitter = SSESplitter()
+    for chunk in response.iter_bytes(_SSE_CHUNK):
+        for event in splitter.feed(chunk):
+            yield from _event_data(event)
+    # 流结束时处理没有以空行结尾的最后一个事件
+    event = splitter.flush()
+    if event is not None:
+        yield from _event_data(event)
+
+
+async def _aiter_sse(response: httpx.Response) -> AsyncIterator[Any]:
+    """按字节增量解析异步流式响应，逐个产出data:中的JSON对象"""
+    splitter = SSESplitter()
+    async for chunk in response.aiter_bytes(_SSE_CHUNK):
+        for event in splitter.feed(chunk):
+            for data in _event_data(event):
+                yield data
+    event = splitter.flush()
+    if event is not None:
+        for data in _event_data(event):
+            yield data
+
+
+class AdmissionController:
+    """可在运行时调整上限的并发准入控制器
+    
+    以条件变量保护的计数器代替asyncio.Semaphore：修改Semaphore._value属于未定义行为，
+    而这里调整上限后会唤醒等待者，正在进行的请求不受影响
+    """
+
+    def __init__(self, max_concurrency: int):
+        """
+        初始化准入控制器
+
+        参数:
+            max_concurrency: 同时进行的请求数上限
+        """
+        self.A = 0
+        self.C_max = max_concurrency
+        self.cond = asyncio.Condition(asyncio.Lock())
+
+    async def acquire(self) -> None:
+        """等待直到进行中的请求数低于上限，然后占用一个名额"""
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.A < self.C_max)
+            self.A += 1
+
+    async def release(self) -> None:
+        """释放一个名额并唤醒一个等待者"""
+        async with self.cond:
+            self.A -= 1
+            self.cond.notify(1)
+
+    async def set_max(self, n: int) -> None:
+        """
+        调整并发上限，调高时唤醒所有等待者
+
+        参数:
+            n: 新的并发上限
+        """
+        async with self.cond:
+            self.C_max = n
+            self.cond.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
+
+
+class _AsyncPool:
+    """共享的异步客户端、并发准入控制器及其使用者计数"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        # 只保存弱引用，连接池作为_POOLS的值不能反过来让事件循环无法回收
+        self.loop_ref = weakref.ref(loop)
+        self.client = _make_client(httpx.AsyncClient, limits=_LIMITS)
+        self.sem = AdmissionController(_SEM_SIZE)
+        # 持有该连接池的实例数，最后一个实例aclose时关闭连接池
+        self.users = 0
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """当前线程中正在运行的事件循环，没有时返回None"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _shared_pool() -> _AsyncPool:
+    """获取当前事件循环的共享异步连接池，不存在或已关闭时创建"""
+    loop = asyncio.get_running_loop()
+    pool = _POOLS.get(loop)
+    if pool is None or pool.client.is_closed:
+        pool = _POOLS[loop] = _AsyncPool(loop)
+    return pool
+
 
 class MCPClient:
+    # 与API密钥无关的固定请求头
+    _BASE_HEADERS = MappingProxyType({
+        "Content-Type": "application/json",
+        "anthropic-version": "2023-06-01",
+    })
+
     def __init__(
         self,
         api_key: str,
@@ -29,15 +232,133 @@ class MCPClient:
         self.model = model
         self.timeout = timeout
         self.max_retries = max_retries
-        self.client = httpx.Client(
-            timeout=timeout,
-            headers={
-                "Content-Type": "application/json",
-                "x-api-key": api_key,
-                "anthropic-version": "2023-06-01",
-            },
+        # 请求URL和请求头在初始化时构建一次，各请求方法直接复用
+        self._url = f"{self.base_url}/v1/messages"
+        self.headers = MappingProxyType({**self._BASE_HEADERS, "x-api-key": api_key})
+        self.client = _make_client(httpx.Client, timeout=timeout, headers=self.headers)
+        self.async_client = None
+        self._sem = None
+        # 本实例获取的连接池，释放时归还的正是这一个对象
+        self._pool: Optional[_AsyncPool] = None
+
+    def _build_payload(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        system: Optional[str],
+        temperature: float,
+        top_p: float,
+        stream: bool,
+        extra: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """
+        构建请求体
+
+        参数:
+            messages: 聊天消息列表
+            max_tokens: 生成的最大令牌数
+            system: 系统提示
+            temperature: 采样温度
+            top_p: 核采样概率
+            stream: 是否流式返回
+            extra: 其他传递给API的参数
+
+        返回:
+            请求体字典
+        """
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+        }
+        if stream:
+            payload["stream"] = True
+        payload.update(extra)
+        if system:
+            payload["system"] = system
+        return payload
+
+    @staticmethod
+    def configure_pool(max_conn: int = 1000, semaphore: int = 64) -> None:
+        """
+        调整共享异步连接池的连接上限和/v1/messages的并发上限，应在首次异步请求前调用
+
+        参数:
+            max_conn: 最大连接数
+            semaphore: 同时进行的请求数上限
+        """
+        global _LIMITS, _SEM_SIZE
+        _LIMITS = httpx.Limits(
+            max_connections=max_conn,
+            max_keepalive_connections=min(max_conn, 100),
+            keepalive_expiry=30,
         )
+        _SEM_SIZE = semaphore
+        # 之后获取连接池的实例按新配置创建；已持有旧连接池的实例继续使用，由其最后一个使用者关闭
+        _POOLS.clear()
+
+    @staticmethod
+    async def set_concurrency(n: int) -> None:
+        """
+        运行时调整/v1/messages的并发上限(例如收到429后降低)，对进行中的请求立即生效
+
+        参数:
+            n: 新的并发上限
+        """
+        global _SEM_SIZE
+        _SEM_SIZE = n
+        pool = _POOLS.get(asyncio.get_running_loop())
+        if pool is not None:
+            await pool.sem.set_max(n)
+
+    async def _ensure_async(self) -> httpx.AsyncClient:
+        """
+        获取当前事件循环的共享异步客户端；超时和请求头按实例在每次请求时传入
+
+        返回:
+            httpx.AsyncClient
+        """
+        pool = self._pool
+        if pool is None or pool.client.is_closed or pool.loop_ref() is not asyncio.get_running_loop():
+            stale = self._release_async()
+            if stale is not None:
+                await stale.aclose()
+            self._pool = _shared_pool()
+            self._pool.users += 1
+            self.async_client, self._sem = self._pool.client, self._pool.sem
+        return self.async_client
+
+    def _release_async(self, keep_shared: bool = False) -> Optional[httpx.AsyncClient]:
+        """
+        释放本实例对所持异步连接池的引用
+
+        参数:
+            keep_shared: 最后一个使用者释放的仍是当前共享连接池时保留它供之后的实例复用
+
+        返回:
+            没有实例再使用时返回需要关闭的连接池，否则返回None
+        """
+        pool, self._pool = self._pool, None
         self.async_client = None
+        self._sem = None
+        if pool is None:
+            return None
+        pool.users -= 1
+        if pool.users > 0:
+            return None
+        loop = pool.loop_ref()
+        if loop is None or loop is not _running_loop():
+            # 所属事件循环已结束或不是当前循环，其连接无法在这里关闭，只丢弃引用
+            if loop is not None and _POOLS.get(loop) is pool:
+                del _POOLS[loop]
+            return None
+        if keep_shared and _POOLS.get(loop) is pool:
+            return None
+        if _POOLS.get(loop) is pool:
+            del _POOLS[loop]
+        return pool.client
 
     async def atext(
         self,
@@ -62,40 +383,26 @@ class MCPClient:
         返回:
             API 响应
         """
-        if self.async_client is None:
-            self.async_client = httpx.AsyncClient(
-                timeout=self.timeout,
-                headers={
-                    "Content-Type": "application/json",
-                    "x-api-key": self.api_key,
-                    "anthropic-version": "2023-06-01",
-                },
-            )
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "top_p": top_p,
-            **kwargs,
-        }
+        await self._ensure_async()
 
-        if system:
-            payload["system"] = system
+        payload = self._build_payload(messages, max_tokens, system, temperature, top_p, False, kwargs)
 
         for attempt in range(self.max_retries):
             try:
-                response = await self.async_client.post(
-                    f"{self.base_url}/v1/messages",
-                    json=payload,
-                )
+                async with self._sem:
+                    response = await self.async_client.post(
+                        self._url,
+                        headers=self.headers,
+                        content=_dumps(payload),
+                        timeout=self.timeout,
+                    )
                 response.raise_for_status()
-                return response.json()
+                return _loads(response.content)
             except httpx.HTTPError as e:
-                if attempt == self.max_retries - 1:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries - 1:
                     raise e
-                await asyncio.sleep(2 ** attempt)  # 指数退避
+                await asyncio.sleep(delay)  # 全抖动指数退避
 
     def text(
         self,
@@ -120,30 +427,21 @@ class MCPClient:
         返回:
             API 响应
         """
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "top_p": top_p,
-            **kwargs,
-        }
-
-        if system:
-            payload["system"] = system
+        payload = self._build_payload(messages, max_tokens, system, temperature, top_p, False, kwargs)
 
         for attempt in range(self.max_retries):
             try:
                 response = self.client.post(
-                    f"{self.base_url}/v1/messages",
-                    json=payload,
+                    self._url,
+                    content=_dumps(payload),
                 )
                 response.raise_for_status()
-                return response.json()
+                return _loads(response.content)
             except httpx.HTTPError as e:
-                if attempt == self.max_retries - 1:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries - 1:
                     raise e
-                time.sleep(2 ** attempt)  # 指数退避
+                time.sleep(delay)  # 全抖动指数退避
 
     async def astream(
         self,
@@ -168,49 +466,28 @@ class MCPClient:
         返回:
             生成文本的异步迭代器
         """
-        if self.async_client is None:
-            self.async_client = httpx.AsyncClient(
-                timeout=self.timeout,
-                headers={
-                    "Content-Type": "application/json",
-                    "x-api-key": self.api_key,
-                    "anthropic-version": "2023-06-01",
-                },
-            )
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "top_p": top_p,
-            "stream": True,
-            **kwargs,
-        }
+        await self._ensure_async()
 
-        if system:
-            payload["system"] = system
+        payload = self._build_payload(messages, max_tokens, system, temperature, top_p, True, kwargs)
 
         for attempt in range(self.max_retries):
             try:
-                async with self.async_client.stream(
+                async with self._sem, self.async_client.stream(
                     "POST",
-                    f"{self.base_url}/v1/messages",
-                    json=payload,
+                    self._url,
+                    headers=self.headers,
+                    content=_dumps(payload),
+                    timeout=self.timeout,
                 ) as response:
                     response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        line = line.strip()
-                        if not line or line == "data: [DONE]":
-                            continue
-                        if line.startswith("data: "):
-                            line = line[6:]
-                            yield json.loads(line)
+                    async for data in _aiter_sse(response):
+                        yield data
                 return  # 正常退出流
             except httpx.HTTPError as e:
-                if attempt == self.max_retries - 1:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries - 1:
                     raise e
-                await asyncio.sleep(2 ** attempt)  # 指数退避
+                await asyncio.sleep(delay)  # 全抖动指数退避
 
     def stream(
         self,
@@ -235,42 +512,60 @@ class MCPClient:
         返回:
             生成文本的迭代器
         """
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "top_p": top_p,
-            "stream": True,
-            **kwargs,
-        }
-
-        if system:
-            payload["system"] = system
+        payload = self._build_payload(messages, max_tokens, system, temperature, top_p, True, kwargs)
 
         for attempt in range(self.max_retries):
             try:
                 with self.client.stream(
                     "POST",
-                    f"{self.base_url}/v1/messages",
-                    json=payload,
+                    self._url,
+                    content=_dumps(payload),
                 ) as response:
                     response.raise_for_status()
-                    for line in response.iter_lines():
-                        line = line.strip()
-                        if not line or line == "data: [DONE]":
-                            continue
-                        if line.startswith("data: "):
-                            line = line[6:]
-                            yield json.loads(line)
+                    yield from _iter_sse(response)
                 return  # 正常退出流
             except httpx.HTTPError as e:
-                if attempt == self.max_retries - 1:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries - 1:
                     raise e
-                time.sleep(2 ** attempt)  # 指数退避
+                time.sleep(delay)  # 全抖动指数退避
 
     def close(self):
-        """关闭客户端连接"""
+        """关闭同步客户端连接；共享的异步连接池需要异步关闭，请使用aclose"""
         self.client.close()
-        if self.async_client:
-            self.async_client.aclose()
\ No newline at end of file
+        # 同步上下文中无法等待连接池关闭：当前共享连接池留给其他实例复用，
+        # 已被configure_pool替换的旧连接池在有运行中的事件循环时交给后台任务关闭
+        stale = self._release_async(keep_shared=True)
+        if stale is not None:
+            try:
+                task = asyncio.get_running_loop().create_task(stale.aclose())
+            except RuntimeError:
+                return
+            _CLOSING.add(task)
+            task.add_done_callback(_CLOSING.discard)
+
+    async def aclose(self):
+        """关闭客户端连接，最后一个使用共享异步连接池的实例会等待连接池关闭"""
+        pool = self._release_async()
+        self.client.close()
+        if pool is not None:
+            await pool.aclose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def __del__(self):
+        # 未显式关闭时兜底关闭同步客户端并提示资源泄漏
+        client = getattr(self, "client", None)
+        if client is not None and not client.is_closed:
+            warnings.warn(f"未关闭的MCPClient: {self!r}，请使用close/aclose或上下文管理器", ResourceWarning)
+            client.close()
\ No newline at end of file
@@ -1,9 +1,42 @@
 import os
 import json
 import asyncio
-from typing import Dict, List, Any, Optional, Union, Callable
+import logging
+import functools
+from typing import Dict, List, Any, Optional, Tuple, Union, Callable
 from .mcp_client import MCPClient
 
+# 优先使用SIMD加速的pybase64，未安装时回退到标准库
+try:
+    import pybase64 as _b64
+except ImportError:
+    import base64 as _b64
+
+# 日志输出方式由应用配置，本模块不安装处理器
+logger = logging.getLogger(__name__)
+
+
+def _safe(default: Any, action: str) -> Callable:
+    """工具调用失败时记录日志并返回默认值的装饰器
+    
+    Args:
+        default: 失败时的返回值，可调用对象时每次调用它生成新的默认值
+        action: 日志中描述的操作名称
+        
+    Returns:
+        Callable: 装饰器
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                logger.warning("%s失败: %s", action, e)
+                return default() if callable(default) else default
+        return wrapper
+    return deco
+
 class PromptTools:
     """MCP提示工具的实用工具和封装器类"""
     
@@ -15,6 +48,7 @@ class PromptTools:
         """
         self.client = mcp_client
     
+    @_safe("", "获取用户输入")
     async def user_input(self, prompt: str, timeout: float = 60) -> str:
         """通过MCP获取用户输入
         
@@ -25,17 +59,14 @@ class PromptTools:
         Returns:
             str: 用户输入的文本
         """
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_prompt_user_for_input", 
-                {"prompt": prompt},
-                timeout=timeout
-            )
-            return result.get("response", "")
-        except Exception as e:
-            print(f"获取用户输入失败: {e}")
-            return ""
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_prompt_user_for_input", 
+            {"prompt": prompt},
+            timeout=timeout
+        )
+        return result.get("response", "")
     
+    @_safe(False, "获取用户确认")
     async def user_confirm(self, 
                            prompt: str, 
                            confirm_button_text: str = "确认",
@@ -52,21 +83,18 @@ class PromptTools:
         Returns:
             bool: 用户是否确认
         """
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_prompt_user_for_confirmation", 
-                {
-                    "prompt": prompt,
-                    "confirmButtonText": confirm_button_text,
-                    "cancelButtonText": cancel_button_text
-                },
-                timeout=timeout
-            )
-            return result.get("confirmed", False)
-        except Exception as e:
-            print(f"获取用户确认失败: {e}")
-            return False
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_prompt_user_for_confirmation", 
+            {
+                "prompt": prompt,
+                "confirmButtonText": confirm_button_text,
+                "cancelButtonText": cancel_button_text
+            },
+            timeout=timeout
+        )
+        return result.get("confirmed", False)
     
+    @_safe("", "获取用户选择")
     async def user_choice(self, 
                           prompt: str, 
                           choices: List[str],
@@ -81,20 +109,17 @@ class PromptTools:
         Returns:
             str: 用户选择的选项
         """
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_prompt_user_for_choice", 
-                {
-                    "prompt": prompt,
-                    "choices": choices
-                },
-                timeout=timeout
-            )
-            return result.get("choice", "")
-        except Exception as e:
-            print(f"获取用户选择失败: {e}")
-            return ""
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_prompt_user_for_choice", 
+            {
+                "prompt": prompt,
+                "choices": choices
+            },
+            timeout=timeout
+        )
+        return result.get("choice", "")
     
+    @_safe(False, "显示消息")
     async def show_message(self, message: str, timeout: float = 10) -> bool:
         """向用户显示消息
         
@@ -105,17 +130,14 @@ class PromptTools:
         Returns:
             bool: 消息是否成功显示
         """
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_show_message", 
-                {"message": message},
-                timeout=timeout
-            )
-            return True
-        except Exception as e:
-            print(f"显示消息失败: {e}")
-            return False
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_show_message", 
+            {"message": message},
+            timeout=timeout
+        )
+        return True
     
+    @_safe(False, "显示面板")
     async def show_panel(self, 
                        html_content: str, 
                        title: str = "信息面板",
@@ -130,20 +152,17 @@ class PromptTools:
         Returns:
             bool: 面板是否成功显示
         """
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_show_panel", 
-                {
-                    "title": title,
-                    "htmlContent": html_content
-                },
-                timeout=timeout
-            )
-            return True
-        except Exception as e:
-            print(f"显示面板失败: {e}")
-            return False
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_show_panel", 
+            {
+                "title": title,
+                "htmlContent": html_content
+            },
+            timeout=timeout
+        )
+        return True
     
+    @_safe(dict, "文件上传")
     async def upload_file(self, 
                          prompt: str = "请上传文件",
                          file_filter: str = "",
@@ -158,20 +177,17 @@ class PromptTools:
         Returns:
             Dict[str, Any]: 文件信息，包含路径、名称、大小等
         """
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_prompt_user_for_file_upload", 
-                {
-                    "prompt": prompt,
-                    "fileFilter": file_filter
-                },
-                timeout=timeout
-            )
-            return result or {}
-        except Exception as e:
-            print(f"文件上传失败: {e}")
-            return {}
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_prompt_user_for_file_upload", 
+            {
+                "prompt": prompt,
+                "fileFilter": file_filter
+            },
+            timeout=timeout
+        )
+        return result or {}
     
+    @_safe(False, "文件保存")
     async def save_file(self, 
                        content: Union[str, bytes], 
                        suggested_filename: str = "",
@@ -193,26 +209,23 @@ class PromptTools:
         content_value = content
         
         if isinstance(content, bytes):
-            import base64
             content_type = "base64"
-            content_value = base64.b64encode(content).decode('utf-8')
-        
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_prompt_user_for_file_save", 
-                {
-                    "content": content_value,
-                    "contentType": content_type,
-                    "suggestedFilename": suggested_filename,
-                    "fileFilter": file_filter
-                },
-                timeout=timeout
-            )
-            return result.get("saved", False)
-        except Exception as e:
-            print(f"文件保存失败: {e}")
-            return False
+            # base64输出只含ASCII字符，按ASCII解码省去UTF-8校验
+            content_value = _b64.b64encode(content).decode('ascii')
+        
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_prompt_user_for_file_save", 
+            {
+                "content": content_value,
+                "contentType": content_type,
+                "suggestedFilename": suggested_filename,
+                "fileFilter": file_filter
+            },
+            timeout=timeout
+        )
+        return result.get("saved", False)
     
+    @_safe("", "读取剪贴板")
     async def clipboard_read(self, timeout: float = 10) -> str:
         """读取用户剪贴板内容
         
@@ -222,17 +235,14 @@ class PromptTools:
         Returns:
             str: 剪贴板内容
         """
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_read_clipboard", 
-                {},
-                timeout=timeout
-            )
-            return result.get("content", "")
-        except Exception as e:
-            print(f"读取剪贴板失败: {e}")
-            return ""
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_read_clipboard", 
+            {},
+            timeout=timeout
+        )
+        return result.get("content", "")
     
+    @_safe(False, "写入剪贴板")
     async def clipboard_write(self, content: str, timeout: float = 10) -> bool:
         """写入内容到用户剪贴板
         
@@ -243,13 +253,31 @@ class PromptTools:
         Returns:
             bool: 是否成功写入
         """
-        try:
-            result = await self.client.call_tool(
-                "mcp_prompt_tools_write_clipboard", 
-                {"content": content},
-                timeout=timeout
-            )
-            return True
-        except Exception as e:
-            print(f"写入剪贴板失败: {e}")
-            return False
\ No newline at end of file
+        result = await self.client.call_tool(
+            "mcp_prompt_tools_write_clipboard", 
+            {"content": content},
+            timeout=timeout
+        )
+        return True
+    
+    async def batch(self, 
+                    calls: List[Tuple[str, Dict[str, Any]]], 
+                    concurrency: int = 32,
+                    timeout: float = 60) -> List[Any]:
+        """并发执行多个工具调用，最多concurrency个同时进行
+        
+        Args:
+            calls: (工具名, 参数) 列表
+            concurrency: 最大并发调用数
+            timeout: 单个调用的超时时间（秒）
+            
+        Returns:
+            List[Any]: 与输入顺序一致的结果列表，失败的调用对应位置为异常对象
+        """
+        sem = asyncio.Semaphore(concurrency)
+        
+        async def _one(tool: str, args: Dict[str, Any]) -> Any:
+            async with sem:
+                return await self.client.call_tool(tool, args, timeout=timeout)
+        
+        return await asyncio.gather(*[_one(tool, args) for tool, args in calls], return_exceptions=True)
@@ -3,8 +3,19 @@ import os
 from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
+# 配置文件读写优先使用orjson，未安装时回退到标准库
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    _loads = json.loads
 
 class SystemRole(str, Enum):
     """系统角色枚举"""
@@ -37,22 +48,28 @@ class MCPSettings:
     
     def __post_init__(self):
         """初始化后处理"""
+        # 默认模型设置由from_config在需要时填充，避免构建后立即被配置文件覆盖
         if self.models is None:
-            self.models = {
-                "claude-3-5-sonnet-20240620": ModelSettings(),
-                "claude-3-opus-20240229": ModelSettings(
-                    name="claude-3-opus-20240229",
-                    temperature=0.7,
-                    top_p=0.95,
-                    max_tokens=4000
-                ),
-                "claude-3-haiku-20240307": ModelSettings(
-                    name="claude-3-haiku-20240307",
-                    temperature=0.7,
-                    top_p=0.95,
-                    max_tokens=4000
-                )
-            }
+            self.models = {}
+    
+    @classmethod
+    def _defaults(cls) -> Dict[str, ModelSettings]:
+        """内置的默认模型设置"""
+        return {
+            "claude-3-5-sonnet-20240620": ModelSettings(),
+            "claude-3-opus-20240229": ModelSettings(
+                name="claude-3-opus-20240229",
+                temperature=0.7,
+                top_p=0.95,
+                max_tokens=4000
+            ),
+            "claude-3-haiku-20240307": ModelSettings(
+                name="claude-3-haiku-20240307",
+                temperature=0.7,
+                top_p=0.95,
+                max_tokens=4000
+            )
+        }
     
     @classmethod
     def from_config(cls, config_file: Union[str, Path] = None) -> 'MCPSettings':
@@ -65,11 +82,11 @@ class MCPSettings:
             
         settings = cls()
         settings.config_file = config_file
+        has_models = False
         
         if config_file.exists():
             try:
-                with open(config_file, "r", encoding="utf-8") as f:
-                    config = json.load(f)
+                config = _loads(config_file.read_bytes())
                 
                 # 加载API密钥和URL
                 settings.api_key = config.get("api_key", "")
@@ -79,6 +96,7 @@ class MCPSettings:
                 
                 # 加载模型设置
                 if "models" in config:
+                    has_models = True
                     for model_name, model_config in config["models"].items():
                         settings.models[model_name] = ModelSettings(
                             name=model_name,
@@ -90,6 +108,10 @@ class MCPSettings:
             except Exception as e:
                 print(f"加载配置文件出错: {e}")
         
+        # 配置文件不存在或未提供模型设置时使用内置默认值
+        if not has_models:
+            settings.models = cls._defaults()
+        
         # 尝试从环境变量加载API密钥
         env_api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not settings.api_key and env_api_key:
@@ -122,5 +144,7 @@ class MCPSettings:
                 "max_tokens": model_settings.max_tokens
             }
             
-        with open(self.config_file, "w", encoding="utf-8") as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+        # 先写临时文件再原子替换，写入中途崩溃不会留下损坏的配置文件
+        tmp_file = self.config_file.with_suffix(".json.tmp")
+        tmp_file.write_bytes(_dumps(config))
+        os.replace(tmp_file, self.config_file)
\ No newline at end of file
@@ -1,5 +1,34 @@
 import math
 import shutil
+import signal
+from functools import lru_cache
+
+
+# 预先构建的填充字符串，log_title按需切片，不必每次都做字符串乘法
+_EQ = "=" * 512
+
+
+@lru_cache(maxsize=1)
+def _terminal_width() -> int:
+    """
+    终端宽度，缓存以避免每次输出都做一次ioctl系统调用
+    """
+    return shutil.get_terminal_size((80, 20)).columns # Default to 80 if size cant be determined
+
+
+def install_resize_handler() -> None:
+    """
+    安装SIGWINCH处理函数，终端大小变化时清除宽度缓存。
+    由命令行入口显式调用；导入本模块不会修改进程的信号处理。
+    已有其他处理函数、平台不支持或不在主线程时不做任何事。
+    """
+    if not hasattr(signal, "SIGWINCH"):
+        return
+    try:
+        if signal.getsignal(signal.SIGWINCH) in (signal.SIG_DFL, None):
+            signal.signal(signal.SIGWINCH, lambda *_: _terminal_width.cache_clear())
+    except ValueError:
+        pass
 
 
 def log_title(message: str) -> None:
@@ -7,9 +36,10 @@ def log_title(message: str) -> None:
     日志输出
     """
     
-    terminal_width = shutil.get_terminal_size((80, 20)).columns # Default to 80 if size cant be determined
-    message_length = len(message)
-    padding = max(0, terminal_width - message_length - 2)
-    left_padding = "=" * (padding // 2)
-    right_padding = "=" * (padding - (padding // 2))
-    print(f"{left_padding} {message} {right_padding}")
\ No newline at end of file
+    terminal_width = _terminal_width()
+    padding = max(0, terminal_width - len(message) - 2)
+    half = padding >> 1
+    if padding <= len(_EQ):
+        print(f"{_EQ[:half]} {message} {_EQ[:padding - half]}")
+    else:
+        print(f"{'=' * half} {message} {'=' * (padding - half)}")
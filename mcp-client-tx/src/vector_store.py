@@ -1,19 +1,68 @@
 import os
+import math
+import mmap
 import numpy as np
 from typing import List, Dict, Any, Optional
 
+# 单对向量的余弦相似度优先使用Numba JIT内核，未安装时回退到NumPy
+try:
+    from numba import njit
+
+    @njit(cache=True, fastmath=True)
+    def _cos(a, b):
+        num = 0.0
+        na = 0.0
+        nb = 0.0
+        for i in range(a.shape[0]):
+            num += a[i] * b[i]
+            na += a[i] * a[i]
+            nb += b[i] * b[i]
+        return num / (math.sqrt(na) * math.sqrt(nb) + 1e-12)
+except ImportError:
+    def _cos(a, b):
+        return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+# int8量化的缩放系数：归一化后的分量落在[-1, 1]，映射到[-127, 127]
+INT8_SCALE = 127.0
+
+# int8模式下每次转换为int32参与计算的行数，限制临时内存
+INT8_BLOCK_ROWS = 4096
+
 class VectorStore:
     """简单的向量存储类，用于存储文档及其嵌入向量"""
     
-    def __init__(self, embedding_dim: int = 1536):
+    def __init__(self, embedding_dim: int = 1536, dtype: str = "float32", mmap_path: Optional[str] = None):
         """初始化向量存储
         
         Args:
             embedding_dim: 嵌入向量的维度
+            dtype: 向量存储精度，"float32"或"int8"；int8在入库时归一化并量化，内存和带宽约为float32的1/4
+            mmap_path: 向量矩阵的磁盘映射文件路径，设置后矩阵由该文件的内存映射承载，超出内存的部分由页缓存按需换入；
+                该文件只作为本实例的后备存储，必须不存在或为空，已有内容时抛出FileExistsError
         """
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"不支持的向量存储精度: {dtype}，可选: float32, int8")
         self.embedding_dim = embedding_dim
+        self.dtype = dtype
         self.documents = []  # 存储所有文档
-        self.vectors = []    # 存储所有嵌入向量
+        # 行归一化(int8模式下再量化)后的向量缓冲区，前_n行有效，容量不足时按倍增扩容
+        self._matrix = np.empty((0, embedding_dim), dtype=np.dtype(dtype))
+        self._cap = 0
+        self._n = 0
+        self.mmap_path = mmap_path
+        self._file = None
+        self._mm: Optional[mmap.mmap] = None
+        if mmap_path is not None:
+            fd = os.open(mmap_path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size:
+                os.close(fd)
+                raise FileExistsError(f"向量映射文件已存在且非空，拒绝覆盖: {mmap_path}")
+            self._file = os.fdopen(fd, "r+b")
+    
+    @property
+    def vectors(self) -> np.ndarray:
+        """所有文档的归一化向量，形状为 (N, d)"""
+        return self._matrix[:self._n]
         
     def add_document(self, document) -> None:
         """将文档添加到向量存储
@@ -21,11 +70,7 @@ class VectorStore:
         Args:
             document: 包含页面内容、元数据和嵌入向量的文档对象
         """
-        if not hasattr(document, 'embedding') or document.embedding is None:
-            raise ValueError("文档必须包含嵌入向量才能添加到向量存储")
-            
-        self.documents.append(document)
-        self.vectors.append(document.embedding)
+        self.add_documents([document])
         
     def add_documents(self, documents: List) -> None:
         """将多个文档添加到向量存储
@@ -33,9 +78,63 @@ class VectorStore:
         Args:
             documents: 文档列表
         """
-        for document in documents:
-            self.add_document(document)
+        if not documents:
+            return
+        if any(not hasattr(document, 'embedding') or document.embedding is None for document in documents):
+            raise ValueError("文档必须包含嵌入向量才能添加到向量存储")
+        
+        # 整批堆叠并归一化后一次写入缓冲区
+        rows = np.stack([np.asarray(document.embedding, dtype=np.float32) for document in documents])
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True) + 1e-12
+        if self.dtype == "int8":
+            # 量化后只保留int8向量，不再持有float副本
+            rows = np.round(rows * INT8_SCALE).astype(np.int8)
+        
+        n = self._n + len(rows)
+        if n > self._cap:
+            self._grow(max(2 * self._cap, n))
+        self._matrix[self._n:n] = rows
+        self._n = n
+        self.documents.extend(documents)
             
+    def _grow(self, cap: int) -> None:
+        """将向量缓冲区扩容到cap行，保留已有的前_n行
+        
+        Args:
+            cap: 新容量
+        """
+        dtype = np.dtype(self.dtype)
+        if self.mmap_path is None:
+            matrix = np.empty((cap, self.embedding_dim), dtype=dtype)
+            matrix[:self._n] = self._matrix[:self._n]
+        else:
+            if self._file is None:
+                raise ValueError("向量存储已关闭")
+            # 先解除旧映射再加长文件(Windows不允许截断仍被映射的文件)，已有的行留在文件中无需复制
+            self._release_mmap()
+            self._file.truncate(cap * self.embedding_dim * dtype.itemsize)
+            self._mm = mmap.mmap(self._file.fileno(), 0)
+            # 搜索时按顺序扫描整个矩阵，提示内核加大预读
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                try:
+                    self._mm.madvise(mmap.MADV_SEQUENTIAL)
+                except OSError:
+                    pass
+            matrix = np.frombuffer(self._mm, dtype=dtype).reshape(cap, self.embedding_dim)
+        self._matrix = matrix
+        self._cap = cap
+    
+    def _release_mmap(self) -> None:
+        """丢弃指向映射的矩阵并关闭当前映射"""
+        self._matrix = np.empty((0, self.embedding_dim), dtype=np.dtype(self.dtype))
+        mm, self._mm = self._mm, None
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                # 调用方仍持有vectors返回的视图，映射在最后一个视图释放时关闭
+                pass
+    
     def cosine_similarity(self, a: List[float], b: List[float]) -> float:
         """计算两个向量之间的余弦相似度
         
@@ -46,9 +145,21 @@ class VectorStore:
         Returns:
             float: 余弦相似度
         """
-        a = np.array(a)
-        b = np.array(b)
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+        return _cos(np.ascontiguousarray(a, dtype=np.float32), np.ascontiguousarray(b, dtype=np.float32))
+    
+    @staticmethod
+    def _quantize(vector) -> np.ndarray:
+        """L2归一化后按INT8_SCALE量化为int8
+        
+        Args:
+            vector: 嵌入向量，或按行排列的多个嵌入向量
+            
+        Returns:
+            np.ndarray: int8向量
+        """
+        v = np.asarray(vector, dtype=np.float32)
+        v = v / (np.linalg.norm(v, axis=-1, keepdims=True) + 1e-12)
+        return np.round(v * INT8_SCALE).astype(np.int8)
     
     def search(self, query_vector: List[float], top_k: int = 3) -> List:
         """搜索与查询向量最相似的文档
@@ -63,26 +174,94 @@ class VectorStore:
         if not self.documents:
             return []
             
-        # 计算查询向量与所有文档向量的相似度
-        similarities = []
-        for vector in self.vectors:
-            similarity = self.cosine_similarity(query_vector, vector)
-            similarities.append(similarity)
+        # 一次矩阵-向量乘法计算查询与所有文档的余弦相似度
+        matrix = self._matrix[:self._n]
+        if self.dtype == "int8":
+            similarities = self._int8_similarities(matrix, self._quantize(query_vector))
+        else:
+            q = np.asarray(query_vector, dtype=np.float32)
+            qn = q / (np.linalg.norm(q) + 1e-12)
+            similarities = matrix @ qn
             
-        # 找到top_k个最相似的文档
-        indices = np.argsort(similarities)[::-1][:top_k]
+        # 找到top_k个最相似的文档：argpartition线性时间选出前k个，只对这k个排序
+        k = min(top_k, similarities.shape[0])
+        if k <= 0:
+            return []
+        part = np.argpartition(-similarities, k - 1)[:k]
+        indices = part[np.argsort(-similarities[part])]
         
         # 返回最相似的文档
-        results = []
-        for idx in indices:
-            results.append(self.documents[idx])
+        return [self.documents[i] for i in indices]
+    
+    def search_many(self, query_vectors, top_k: int = 3) -> List[List]:
+        """批量搜索多个查询向量，一次矩阵乘法计算所有相似度
+        
+        Args:
+            query_vectors: 形状为 (M, d) 的查询向量矩阵或向量列表
+            top_k: 每个查询返回的最相似文档数量
             
-        return results
+        Returns:
+            List[List]: 与查询顺序一致的最相似文档列表
+        """
+        # 复制一份，原地归一化不影响调用方的数组
+        Q = np.array(query_vectors, dtype=np.float32, ndmin=2)
+        k = min(top_k, self._n)
+        if k <= 0:
+            return [[] for _ in range(Q.shape[0])]
+        
+        matrix = self._matrix[:self._n]
+        if self.dtype == "int8":
+            S = self._int8_similarities(matrix, self._quantize(Q)).T
+        else:
+            Q /= np.linalg.norm(Q, axis=1, keepdims=True) + 1e-12
+            S = Q @ matrix.T
         
+        # 逐行选出前k个再排序
+        part = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        row = np.arange(S.shape[0])[:, None]
+        order = np.argsort(-S[row, part], axis=1)
+        idx = part[row, order]
+        documents = self.documents
+        return [[documents[i] for i in row_idx] for row_idx in idx.tolist()]
+        
+    @staticmethod
+    def _int8_similarities(matrix: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """int8矩阵与int8查询的点积，分块以int32累加避免溢出，并还原为余弦相似度
+        
+        Args:
+            matrix: 形状为 (N, d) 的int8矩阵
+            q: 形状为 (d,) 的int8查询向量，或 (M, d) 的多个查询
+            
+        Returns:
+            np.ndarray: 形状为 (N,) 或 (N, M) 的float32相似度
+        """
+        q32 = q.astype(np.int32).T
+        similarities = np.empty((matrix.shape[0],) + q.shape[:-1], dtype=np.float32)
+        for start in range(0, matrix.shape[0], INT8_BLOCK_ROWS):
+            block = matrix[start:start + INT8_BLOCK_ROWS]
+            similarities[start:start + block.shape[0]] = block.astype(np.int32) @ q32
+        similarities /= INT8_SCALE * INT8_SCALE
+        return similarities
+    
     def clear(self) -> None:
         """清空向量存储"""
         self.documents = []
-        self.vectors = []
+        self._matrix = np.empty((0, self.embedding_dim), dtype=np.dtype(self.dtype))
+        self._cap = 0
+        self._n = 0
+        if self._file is not None:
+            self._release_mmap()
+            self._file.truncate(0)
+    
+    def close(self) -> None:
+        """关闭映射文件，之后不能再添加文档；未设置mmap_path时只清空内存"""
+        self.documents = []
+        self._cap = 0
+        self._n = 0
+        self._release_mmap()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
         
     def size(self) -> int:
         """获取向量存储中的文档数量
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+try:
+    from mcp_client.client import AdmissionController
+except ImportError:  # 未安装httpx
+    AdmissionController = None
+
+
+@unittest.skipIf(AdmissionController is None, "需要httpx")
+class AdmissionControllerTest(unittest.TestCase):
+    """AdmissionController: 并发上限与运行时调整"""
+
+    def test_limits_concurrency(self):
+        async def run():
+            controller = AdmissionController(2)
+            active = peak = 0
+
+            async def worker():
+                nonlocal active, peak
+                async with controller:
+                    active += 1
+                    peak = max(peak, active)
+                    await asyncio.sleep(0.01)
+                    active -= 1
+
+            await asyncio.gather(*[worker() for _ in range(8)])
+            return peak, controller.A
+
+        peak, remaining = asyncio.run(run())
+        self.assertEqual(peak, 2)
+        self.assertEqual(remaining, 0)
+
+    def test_raising_limit_wakes_waiters(self):
+        async def run():
+            controller = AdmissionController(1)
+            await controller.acquire()
+            waiter = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0.01)
+            blocked = not waiter.done()
+            await controller.set_max(2)
+            await asyncio.wait_for(waiter, 1)
+            return blocked, controller.A
+
+        blocked, active = asyncio.run(run())
+        self.assertTrue(blocked)
+        self.assertEqual(active, 2)
+
+    def test_lowering_limit_keeps_inflight_requests(self):
+        async def run():
+            controller = AdmissionController(3)
+            for _ in range(3):
+                await controller.acquire()
+            await controller.set_max(1)
+            waiter = asyncio.ensure_future(controller.acquire())
+            # 进行中的3个请求不受影响；降到上限以下之前新请求一直等待
+            await controller.release()
+            await controller.release()
+            await asyncio.sleep(0.01)
+            still_blocked = not waiter.done()
+            await controller.release()
+            await asyncio.wait_for(waiter, 1)
+            return still_blocked, controller.A
+
+        still_blocked, active = asyncio.run(run())
+        self.assertTrue(still_blocked)
+        self.assertEqual(active, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
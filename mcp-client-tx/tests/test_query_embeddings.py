@@ -0,0 +1,71 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+try:
+    from langchain_retriever import CachedQueryEmbeddings
+except ImportError:  # 未安装faiss/langchain
+    CachedQueryEmbeddings = None
+
+
+class _CountingEmbeddings:
+    """按文本生成确定向量并记录请求次数的嵌入模型"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@unittest.skipIf(CachedQueryEmbeddings is None, "需要faiss和langchain")
+class CachedQueryEmbeddingsTest(unittest.TestCase):
+    """CachedQueryEmbeddings: 批量查询嵌入的LRU缓存"""
+
+    def test_batch_larger_than_maxsize(self):
+        inner = _CountingEmbeddings()
+        cached = CachedQueryEmbeddings(inner, maxsize=4)
+        queries = [f"查询{i}" for i in range(6)]
+        self.assertEqual(cached.embed_queries(queries), inner.embed_documents(queries))
+        self.assertEqual(len(cached._cache), 4)
+
+    def test_hits_and_duplicates(self):
+        inner = _CountingEmbeddings()
+        cached = CachedQueryEmbeddings(inner, maxsize=8)
+        cached.embed_queries(["a", "b"])
+        result = cached.embed_queries(["b", "c", "c", "a"])
+        self.assertEqual(inner.calls, [["a", "b"], ["c"]])
+        self.assertEqual(result, [[1.0, 98.0], [1.0, 99.0], [1.0, 99.0], [1.0, 97.0]])
+        self.assertEqual(cached.embed_query("a"), [1.0, 97.0])
+
+    def test_concurrent_eviction(self):
+        cached = CachedQueryEmbeddings(_CountingEmbeddings(), maxsize=2)
+        errors = []
+
+        def worker(offset):
+            try:
+                for i in range(200):
+                    queries = [f"q{(offset + i + j) % 7}" for j in range(3)]
+                    self.assertEqual(len(cached.embed_queries(queries)), 3)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import importlib.util
+import os
+import unittest
+
+# _sse.py没有第三方依赖，按文件路径加载，避免经由mcp_client/__init__导入httpx
+_SSE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "mcp_client", "_sse.py")
+_spec = importlib.util.spec_from_file_location("_sse", _SSE_PATH)
+_sse = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_sse)
+SSESplitter = _sse.SSESplitter
+
+
+def _split(data: bytes, size: int):
+    """按size字节分块喂给分帧器，返回所有事件(含flush出的最后一个)"""
+    splitter = SSESplitter()
+    events = []
+    for i in range(0, len(data), size):
+        events.extend(splitter.feed(data[i:i + size]))
+    last = splitter.flush()
+    if last is not None:
+        events.append(last)
+    return events
+
+
+class SSESplitterTest(unittest.TestCase):
+    """SSESplitter: 不同行尾和任意分块边界下的事件切分"""
+
+    EXPECTED = [b'event: a\ndata: {"x": 1}', b'event: b\ndata: {"y": 2}']
+
+    def assertSplits(self, data: bytes, expected):
+        # 包括逐字节喂入，覆盖\r与\n落在不同块的情况
+        for size in (1, 2, 3, 7, len(data)):
+            with self.subTest(size=size):
+                self.assertEqual(_split(data, size), expected)
+
+    def test_lf(self):
+        self.assertSplits(b'event: a\ndata: {"x": 1}\n\nevent: b\ndata: {"y": 2}\n\n', self.EXPECTED)
+
+    def test_crlf(self):
+        self.assertSplits(b'event: a\r\ndata: {"x": 1}\r\n\r\nevent: b\r\ndata: {"y": 2}\r\n\r\n', self.EXPECTED)
+
+    def test_cr(self):
+        self.assertSplits(b'event: a\rdata: {"x": 1}\r\revent: b\rdata: {"y": 2}\r\r', self.EXPECTED)
+
+    def test_mixed_line_endings(self):
+        self.assertSplits(b'event: a\r\ndata: {"x": 1}\n\revent: b\rdata: {"y": 2}\r\n\n', self.EXPECTED)
+
+    def test_last_event_without_blank_line(self):
+        self.assertSplits(b'event: a\r\ndata: {"x": 1}\r\n\r\nevent: b\r\ndata: {"y": 2}\r\n',
+                          [self.EXPECTED[0], b'event: b\ndata: {"y": 2}\n'])
+
+    def test_trailing_whitespace_is_not_an_event(self):
+        self.assertSplits(b'data: 1\n\n\r\n', [b'data: 1'])
+
+    def test_incomplete_event_stays_buffered(self):
+        splitter = SSESplitter()
+        self.assertEqual(splitter.feed(b"data: 1\r"), [])
+        self.assertEqual(splitter.feed(b"\n"), [])
+        self.assertEqual(splitter.feed(b"\r\n"), [b"data: 1"])
+        self.assertIsNone(splitter.flush())
+
+
+if __name__ == "__main__":
+    unittest.main()
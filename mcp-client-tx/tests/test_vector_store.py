@@ -0,0 +1,113 @@
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+try:
+    import numpy as np
+    from vector_store import VectorStore
+except ImportError:  # 未安装numpy
+    np = None
+
+
+def _docs(vectors):
+    """构造带embedding属性的文档，page_content记录行号便于比对"""
+    return [SimpleNamespace(page_content=str(i), embedding=list(v)) for i, v in enumerate(vectors)]
+
+
+@unittest.skipIf(np is None, "需要numpy")
+class VectorStoreTest(unittest.TestCase):
+    """VectorStore: 缓冲区扩容、mmap后备文件、int8量化与批量搜索"""
+
+    DIM = 16
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.vectors = self.rng.standard_normal((50, self.DIM)).astype(np.float32)
+
+    def _normalized(self):
+        return self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+
+    def test_growth_keeps_rows(self):
+        store = VectorStore(embedding_dim=self.DIM)
+        docs = _docs(self.vectors)
+        store.add_document(docs[0])
+        self.assertEqual(store._cap, 1)
+        store.add_documents(docs[1:3])
+        self.assertEqual(store._cap, 3)
+        store.add_documents(docs[3:4])
+        self.assertEqual(store._cap, 6)
+        store.add_documents(docs[4:])
+        self.assertEqual(store.size(), 50)
+        self.assertGreaterEqual(store._cap, 50)
+        np.testing.assert_allclose(store.vectors, self._normalized(), rtol=1e-5, atol=1e-6)
+
+    def test_mmap_growth_and_refuses_existing_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "vectors.bin")
+            store = VectorStore(embedding_dim=self.DIM, mmap_path=path)
+            for doc in _docs(self.vectors):
+                store.add_document(doc)
+            np.testing.assert_allclose(store.vectors, self._normalized(), rtol=1e-5, atol=1e-6)
+            self.assertEqual(os.path.getsize(path), store._cap * self.DIM * 4)
+            self.assertEqual(store.search(self.vectors[7], top_k=1)[0].page_content, "7")
+
+            # 已有内容的文件不会被覆盖
+            with self.assertRaises(FileExistsError):
+                VectorStore(embedding_dim=self.DIM, mmap_path=path)
+
+            store.clear()
+            self.assertEqual(os.path.getsize(path), 0)
+            store.close()
+
+    def test_int8_matches_float32_ranking(self):
+        float_store = VectorStore(embedding_dim=self.DIM)
+        int8_store = VectorStore(embedding_dim=self.DIM, dtype="int8")
+        float_store.add_documents(_docs(self.vectors))
+        int8_store.add_documents(_docs(self.vectors))
+        self.assertEqual(int8_store.vectors.dtype, np.int8)
+        self.assertLessEqual(int(np.abs(int8_store.vectors.astype(np.int32)).max()), 127)
+
+        for i in range(10):
+            with self.subTest(query=i):
+                query = self.vectors[i] + 0.01 * self.rng.standard_normal(self.DIM).astype(np.float32)
+                self.assertEqual(int8_store.search(query, top_k=1)[0].page_content,
+                                 float_store.search(query, top_k=1)[0].page_content)
+
+    def test_unknown_dtype(self):
+        with self.assertRaises(ValueError):
+            VectorStore(embedding_dim=self.DIM, dtype="float16")
+
+    def test_search_many_matches_search(self):
+        for dtype in ("float32", "int8"):
+            with self.subTest(dtype=dtype):
+                store = VectorStore(embedding_dim=self.DIM, dtype=dtype)
+                store.add_documents(_docs(self.vectors))
+                queries = self.rng.standard_normal((5, self.DIM)).astype(np.float32)
+                original = queries.copy()
+
+                batched = store.search_many(queries, top_k=3)
+                self.assertEqual(len(batched), 5)
+                for query, results in zip(queries, batched):
+                    # int8的整数点积可能出现并列，只比较集合
+                    self.assertEqual({doc.page_content for doc in results},
+                                     {doc.page_content for doc in store.search(query, top_k=3)})
+                # 调用方的数组不被原地归一化
+                np.testing.assert_array_equal(queries, original)
+
+    def test_search_many_edge_cases(self):
+        store = VectorStore(embedding_dim=self.DIM)
+        self.assertEqual(store.search_many(self.vectors[:2], top_k=3), [[], []])
+        store.add_documents(_docs(self.vectors[:2]))
+        # 单个查询向量按一行处理；top_k超过文档数时返回全部文档
+        results = store.search_many(self.vectors[1], top_k=5)
+        self.assertEqual(len(results), 1)
+        self.assertEqual([doc.page_content for doc in results[0]][0], "1")
+        self.assertEqual(len(results[0]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()